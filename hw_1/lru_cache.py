@@ -1,44 +1,84 @@
+import heapq
+import sys
+import threading
 import time
 from random import randint
 from typing import Union
 
 
 class Record:
-    def __init__(self, value=None, ttl: Union[int, float] = 60):
-        self._value = value
-        self._ttl = ttl
-        self._calls = 0
+    """Cached value with its expiration time and hits amount.
 
-    @property
-    def value(self):
-        return self._value
+    Records are slotted, linked into the recency list of the cache
+    and ordered by expiration time, so one record serves as the node
+    of the recency list and as the entry of the expiry heap.
+    """
+    __slots__ = ('key', 'value', 'ttl', 'calls', 'weight', 'prev', 'next')
 
-    @property
-    def ttl(self):
-        return self._ttl
+    def __init__(self, value=None, ttl: Union[int, float] = 60, key=None,
+                 weight: int = 0):
+        self.key = key
+        self.value = value
+        self.ttl = ttl
+        self.calls = 0
+        self.weight = weight
+        self.prev = None
+        self.next = None
 
-    @property
-    def calls(self):
-        return self._calls
+    def __lt__(self, other):
+        return self.ttl < other.ttl
 
-    @ttl.setter
-    def ttl(self, value):
-        self._ttl = value
 
-    @calls.setter
-    def calls(self, value):
-        self._calls = value
+class LRUCache:
+    """Least-recently-used cache with per-record expiration time.
 
+    Records are indexed by a dict and linked into a circular list
+    ordered from the least to the most recently used one (a linked
+    hash map), so `get`, `push` and `pop` are O(1) and eviction
+    always drops the oldest record.
 
-class LRUCache:
-    def __init__(self, size: int = 2, default_ttl: int = 60):
+    Expiration times are indexed by a lazy-deletion min-heap, so only
+    records that are actually due are reaped. Pass `reap_interval`
+    to reap them from a background thread as well.
+
+    Pass `max_bytes` to bound the total weight of the records as
+    well as their amount. The weight of a value is computed by
+    `weigher` (`sys.getsizeof` by default); records heavier than the
+    whole budget are not cached.
+
+    Pass a `hw_1.spill.SpillFile` as `spill` to keep evicted records
+    on disk; they are promoted back to memory by `get`.
+    """
+
+    def __init__(self, size: int = 2, default_ttl: int = 60,
+                 reap_interval: float = None, max_bytes: int = None,
+                 weigher=sys.getsizeof, spill=None):
         assert default_ttl > 0, "`default_ttl` should be positive."
         assert size > 0, "`size` should be positive."
+        assert max_bytes is None or max_bytes > 0, \
+            "`max_bytes` should be positive."
 
         self._default_ttl = default_ttl
         self._max_size = size
+        self._max_bytes = max_bytes
+        self._weigher = weigher
+        self._bytes = 0
+        self._spill = spill
         self._storage = dict()
-        self._ttl = dict()
+        # sentinel of the recency list: `_root.next` is the least
+        # recently used record, `_root.prev` is the most recent one
+        self._root = Record()
+        self._root.prev = self._root.next = self._root
+        self._evictions = 0
+        # records ordered by expiration time; popped or overwritten
+        # records stay in the heap until they are due
+        self._expiry = []
+        self._lock = threading.RLock()
+
+        self._reaper = None
+        self._reaper_stop = threading.Event()
+        if reap_interval:
+            self.start_reaper(reap_interval)
 
     @property
     def max_size(self):
@@ -53,37 +93,105 @@ class LRUCache:
         assert value > 0, "`value` should be positive."
         self._default_ttl = value
 
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def total_bytes(self):
+        """Total weight of the stored records."""
+        return self._bytes
+
+    @property
+    def evictions(self):
+        """Amount of records dropped to free space for new ones."""
+        return self._evictions
+
+    @property
+    def spill(self):
+        return self._spill
+
+    def weight(self, key):
+        """Returns weight of the record or None if it doesn't exist."""
+        record = self._storage.get(key, None)
+        if record:
+            return record.weight
+        return None
+
     @property
     def size(self):
-        self._clean_expired()
-        return len(self._storage)
+        with self._lock:
+            self._reap()
+            return len(self._storage)
 
     def exist(self, key):
         """If record exists returns True else False"""
         record = self._storage.get(key, None)
         if record:
             return record.ttl >= time.time()
+        if self._spill is not None:
+            return key in self._spill
         return False
 
-    def get(self, key):
-        record = self._storage.get(key, None)
-        if record:
-            if record.ttl >= time.time():
-                self._ttl[key] += 1
-                return record.value
-            else:
-                self._ttl.pop(key)
-                self._storage.pop(key)
-        return None
+    def get(self, key, default=None):
+        with self._lock:
+            record = self._storage.get(key, None)
+            if record:
+                if record.ttl >= time.time():
+                    record.calls += 1
+                    self._unlink(record)
+                    self._link(record)
+                    return record.value
+                else:
+                    self._remove(key)
+            if self._spill is not None:
+                found = self._spill.take(key)
+                if found:
+                    value, ttl_time = found
+                    self._insert(key, value, ttl_time)
+                    return value
+            return default
+
+    def get_many(self, keys, default=None):
+        """Returns {key: value} for the given keys, missing ones are
+        mapped to `default`. Keys are touched in the given order."""
+        result = dict()
+        with self._lock:
+            now = time.time()
+            storage = self._storage
+            for key in keys:
+                record = storage.get(key, None)
+                if record and record.ttl >= now:
+                    record.calls += 1
+                    self._unlink(record)
+                    self._link(record)
+                    result[key] = record.value
+                    continue
+                if record:
+                    self._remove(key)
+                result[key] = default
+                if self._spill is not None:
+                    found = self._spill.take(key)
+                    if found:
+                        result[key], ttl_time = found
+                        self._insert(key, result[key], ttl_time)
+        return result
 
     def pop(self, key):
-        record = self._storage.get(key, None)
-        if record:
-            self._ttl.pop(key)
-            self._storage.pop(key)
+        with self._lock:
+            if key in self._storage:
+                self._remove(key)
+            if self._spill is not None:
+                self._spill.discard(key)
 
     def clean(self):
-        self._storage.clear()
+        with self._lock:
+            self._storage.clear()
+            self._root.prev = self._root.next = self._root
+            self._expiry.clear()
+            self._bytes = 0
+            if self._spill is not None:
+                self._spill.clear()
 
     def push(self, key, value, ttl: int = None):
         assert isinstance(ttl, type(None)) or ttl > 0, \
@@ -91,15 +199,227 @@ class LRUCache:
         if not ttl:
             ttl = self.default_ttl
         ttl_time = int(time.time() + ttl)
-        if self.size == self.max_size:
-            not_popular = min(self._ttl, key=self._ttl.get)
-            self.pop(not_popular)
+        with self._lock:
+            if self._spill is not None:
+                self._spill.discard(key)
+            self._insert(key, value, ttl_time)
+
+    def push_many(self, mapping: dict, ttl: int = None):
+        """Pushes all records of the mapping with the same `ttl`;
+        expired records are reaped and the cache is shrunk once."""
+        assert isinstance(ttl, type(None)) or ttl > 0, \
+            "`ttl` should be positive."
+        if not ttl:
+            ttl = self.default_ttl
+        ttl_time = int(time.time() + ttl)
+        with self._lock:
+            self._reap()
+            for key, value in mapping.items():
+                if self._spill is not None:
+                    self._spill.discard(key)
+                self._add(key, value, ttl_time)
+            self._evict(self.max_size, 0)
+            if len(self._expiry) > 2 * len(self._storage) + 64:
+                self._rebuild_expiry()
+
+    def _insert(self, key, value, ttl_time: Union[int, float]):
+        self._reap()
+        record = self._add(key, value, ttl_time, self.max_size - 1)
+        if record and len(self._expiry) > 2 * len(self._storage) + 64:
+            self._rebuild_expiry()
+
+    def _add(self, key, value, ttl_time: Union[int, float],
+             keep: int = None):
+        """Links the new record, evicting old ones down to `keep`
+        records to free space for it when `keep` is given."""
+        weight = self._weigher(value) if self._max_bytes else 0
+        if key in self._storage:
+            self._remove(key)
+        if self._max_bytes and weight > self._max_bytes:
+            return None
+        if keep is not None:
+            self._evict(keep, weight)
+
+        record = Record(value, ttl_time, key, weight)
+        self._storage[key] = record
+        self._bytes += weight
+        self._link(record)
+        heapq.heappush(self._expiry, record)
+        return record
+
+    def _evict(self, keep: int, weight: int):
+        """Drops the least recently used records until at most `keep`
+        of them are left and `weight` more bytes fit the budget."""
+        while len(self._storage) > keep or (
+                self._max_bytes and self._bytes + weight > self._max_bytes):
+            evicted = self._root.next
+            self._remove(evicted.key)
+            self._evictions += 1
+            if self._spill is not None:
+                self._spill.put(evicted.key, evicted.value, evicted.ttl)
+
+    def start_reaper(self, interval: float = 1.0):
+        """Starts a daemon thread which drops expired records
+        every `interval` seconds."""
+        assert interval > 0, "`interval` should be positive."
+        if self._reaper:
+            return
+        self._reaper_stop.clear()
+        self._reaper = threading.Thread(target=self._reap_forever,
+                                        args=(interval,), daemon=True)
+        self._reaper.start()
+
+    def stop_reaper(self):
+        if self._reaper:
+            self._reaper_stop.set()
+            self._reaper.join()
+            self._reaper = None
+
+    def _reap_forever(self, interval: float):
+        while not self._reaper_stop.wait(interval):
+            with self._lock:
+                self._reap()
+
+    def _reap(self):
+        """Removes records which are due, O(log n) per removed record."""
+        now = time.time()
+        expiry = self._expiry
+        while expiry and expiry[0].ttl < now:
+            record = heapq.heappop(expiry)
+            # skip stale entries of popped or re-pushed records
+            if self._storage.get(record.key, None) is record:
+                self._remove(record.key)
+
+    def _link(self, record: Record):
+        """Makes the record the most recently used one."""
+        last = self._root.prev
+        record.prev = last
+        record.next = self._root
+        last.next = self._root.prev = record
+
+    @staticmethod
+    def _unlink(record: Record):
+        record.prev.next = record.next
+        record.next.prev = record.prev
+        record.prev = record.next = None
+
+    def _remove(self, key):
+        record = self._storage.pop(key)
+        self._bytes -= record.weight
+        self._unlink(record)
+
+    def _rebuild_expiry(self):
+        """Drops stale heap entries once they outnumber live records."""
+        self._expiry = list(self._storage.values())
+        heapq.heapify(self._expiry)
+
+
+class ShardedLRUCache:
+    """Thread-safe LRU cache which spreads keys over `shards`
+    independently locked `LRUCache` instances.
+
+    Total capacity is `size`; eviction is least-recently-used
+    within the shard a key hashes to.
+    """
+
+    def __init__(self, size: int = 2, default_ttl: int = 60,
+                 shards: int = 16, reap_interval: float = None,
+                 max_bytes: int = None, weigher=sys.getsizeof, spill=None):
+        assert size > 0, "`size` should be positive."
+        assert shards > 0, "`shards` should be positive."
+
+        shards = min(shards, size)
+        if max_bytes:
+            shards = min(shards, max_bytes)
+        self._max_size = size
+        self._max_bytes = max_bytes
+        self._shards = [
+            LRUCache(size // shards + (1 if i < size % shards else 0),
+                     default_ttl, reap_interval,
+                     max_bytes and max_bytes // shards, weigher, spill)
+            for i in range(shards)
+        ]
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    @property
+    def default_ttl(self):
+        return self._shards[0].default_ttl
+
+    @default_ttl.setter
+    def default_ttl(self, value: int):
+        for shard in self._shards:
+            shard.default_ttl = value
+
+    @property
+    def shards(self):
+        return len(self._shards)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @property
+    def total_bytes(self):
+        return sum(shard.total_bytes for shard in self._shards)
+
+    @property
+    def evictions(self):
+        return sum(shard.evictions for shard in self._shards)
+
+    def weight(self, key):
+        return self._shard(key).weight(key)
+
+    @property
+    def size(self):
+        return sum(shard.size for shard in self._shards)
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def exist(self, key):
+        """If record exists returns True else False"""
+        return self._shard(key).exist(key)
+
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+
+    def get_many(self, keys, default=None):
+        keys = list(keys)
+        result = dict()
+        for shard, shard_keys in self._group(keys).items():
+            result.update(shard.get_many(shard_keys, default))
+        return {key: result[key] for key in keys}
+
+    def push_many(self, mapping: dict, ttl: int = None):
+        for shard, shard_keys in self._group(mapping).items():
+            shard.push_many({key: mapping[key] for key in shard_keys}, ttl)
+
+    def _group(self, keys):
+        groups = dict()
+        for key in keys:
+            groups.setdefault(self._shard(key), []).append(key)
+        return groups
+
+    def pop(self, key):
+        self._shard(key).pop(key)
+
+    def clean(self):
+        for shard in self._shards:
+            shard.clean()
+
+    def push(self, key, value, ttl: int = None):
+        self._shard(key).push(key, value, ttl)
 
-        self._ttl[key] = 0
-        self._storage[key] = Record(value, ttl_time)
+    def start_reaper(self, interval: float = 1.0):
+        for shard in self._shards:
+            shard.start_reaper(interval)
 
-    def _clean_expired(self):
-        self._storage = {k: v for k, v in self._storage.items() if v.ttl >= time.time()}
+    def stop_reaper(self):
+        for shard in self._shards:
+            shard.stop_reaper()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,171 @@
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, wait
+from random import randint
+
+from hw_1.lru_cache import LRUCache, ShardedLRUCache
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+
+def bench_per_op_latency(size: int, operations: int = 100000):
+    """Fills the cache up to `size` records and measures mean latency
+    of `get` / `push` / `pop` on the full cache."""
+    cache = LRUCache(size=size, default_ttl=600)
+    for i in range(size):
+        cache.push(i, i)
+
+    keys = [randint(0, size - 1) for _ in range(operations)]
+    results = {}
+
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    results['get'] = (time.perf_counter() - start) / operations
+
+    # every push of a new key evicts the least recently used record
+    start = time.perf_counter()
+    for i in range(size, size + operations):
+        cache.push(i, i)
+    results['push'] = (time.perf_counter() - start) / operations
+
+    start = time.perf_counter()
+    for i in range(size, size + operations):
+        cache.pop(i)
+    results['pop'] = (time.perf_counter() - start) / operations
+    return results
+
+
+def bench_write_heavy(size: int, operations: int = 100000):
+    """Measures mean latency of `push` followed by a `size` read on a
+    full cache where half of the records are already due."""
+    cache = LRUCache(size=size, default_ttl=600)
+    for i in range(size):
+        cache.push(i, i, ttl=1 if i % 2 else 600)
+    time.sleep(2)
+
+    start = time.perf_counter()
+    for i in range(size, size + operations):
+        cache.push(i, i)
+        cache.size
+    return (time.perf_counter() - start) / operations
+
+
+def bench_contention(cache, threads: int, operations: int = 200000):
+    """Runs `operations` mixed `get` / `push` calls split between
+    `threads` workers and returns throughput in operations per second."""
+    size = cache.max_size
+    per_thread = operations // threads
+
+    def work(seed):
+        for i in range(per_thread):
+            key = (seed * per_thread + i * 7919) % (2 * size)
+            if cache.get(key) is None:
+                cache.push(key, key)
+
+    pool = ThreadPoolExecutor(max_workers=threads)
+    start = time.perf_counter()
+    wait([pool.submit(work, seed) for seed in range(threads)])
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return per_thread * threads / elapsed
+
+
+class _DictRecord:
+    """Record layout used before the slotted `Record`."""
+
+    def __init__(self, value=None, ttl=60):
+        self._value = value
+        self._ttl = ttl
+        self._calls = 0
+
+
+def _measure(fill, entries: int):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    storage = fill(entries)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del storage
+    return (after - before) / entries
+
+
+def _fill_legacy(entries: int):
+    storage, hits = dict(), dict()
+    for i in range(entries):
+        hits[i] = 0
+        storage[i] = _DictRecord(None, int(time.time() + 600))
+    return storage, hits
+
+
+def _fill_cache(entries: int):
+    cache = LRUCache(size=entries, default_ttl=600)
+    for i in range(entries):
+        cache.push(i, None)
+    return cache
+
+
+def run_memory(entries: int = 1000000):
+    print(f'{"layout":>10} {"bytes/entry":>12}')
+    print(f'{"legacy":>10} {_measure(_fill_legacy, entries):>12.1f}')
+    print(f'{"LRUCache":>10} {_measure(_fill_cache, entries):>12.1f}')
+
+
+def bench_batch(keys: int, batch: int = 1000):
+    """Returns seconds spent to push and to get `keys` records one by
+    one and in batches of `batch` keys."""
+    results = {}
+    cache = LRUCache(size=keys, default_ttl=600)
+    start = time.perf_counter()
+    for i in range(keys):
+        cache.push(i, i)
+    for i in range(keys):
+        cache.get(i)
+    results['per key'] = time.perf_counter() - start
+
+    cache = LRUCache(size=keys, default_ttl=600)
+    start = time.perf_counter()
+    for i in range(0, keys, batch):
+        cache.push_many({j: j for j in range(i, min(i + batch, keys))})
+    for i in range(0, keys, batch):
+        cache.get_many(range(i, min(i + batch, keys)))
+    results['batched'] = time.perf_counter() - start
+    return results
+
+
+def run_latency():
+    print(f'{"size":>10} {"get, us":>10} {"push, us":>10} {"pop, us":>10}')
+    for size in SIZES:
+        results = bench_per_op_latency(size)
+        print(f'{size:>10} {results["get"] * 1e6:>10.3f} '
+              f'{results["push"] * 1e6:>10.3f} {results["pop"] * 1e6:>10.3f}')
+
+
+def run_write_heavy():
+    print(f'{"size":>10} {"push + size, us":>16}')
+    for size in SIZES:
+        print(f'{size:>10} {bench_write_heavy(size) * 1e6:>16.3f}')
+
+
+def run_contention(size: int = 100000):
+    print(f'{"threads":>8} {"LRUCache, op/s":>16} {"Sharded, op/s":>16}')
+    for threads in (1, 2, 4, 8, 16):
+        single = bench_contention(LRUCache(size, 600), threads)
+        sharded = bench_contention(ShardedLRUCache(size, 600), threads)
+        print(f'{threads:>8} {single:>16.0f} {sharded:>16.0f}')
+
+
+def run_batch():
+    print(f'{"keys":>10} {"per key, s":>12} {"batched, s":>12}')
+    for keys in (10000, 100000, 1000000):
+        results = bench_batch(keys)
+        print(f'{keys:>10} {results["per key"]:>12.3f} '
+              f'{results["batched"]:>12.3f}')
+
+
+if __name__ == '__main__':
+    run_latency()
+    run_write_heavy()
+    run_contention()
+    run_memory()
+    run_batch()
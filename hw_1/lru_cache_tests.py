@@ -1,6 +1,8 @@
 import importlib
 import sys
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from io import StringIO
 from time import sleep
 from unittest import mock
@@ -86,6 +88,131 @@ class InterfaceTestCase(unittest.TestCase):
 
         self._check_stdout_empty('mid_skip_queue')
 
+    def test_lru_eviction(self):
+        LRUCache = self._load_function(0, 'lru_cache', 'LRUCache')
+
+        cache = LRUCache(size=3, default_ttl=5)
+        for i in range(3):
+            cache.push(i, i)
+        self.assertEqual(0, cache.get(0))
+        cache.push(3, 3)
+        self.assertEqual(None, cache.get(1))
+        cache.push(2, 'two')
+        cache.push(4, 4)
+        self.assertEqual(None, cache.get(0))
+        self.assertEqual('two', cache.get(2))
+        self.assertEqual(3, cache.size)
+
+        self._check_stdout_empty('lru_cache')
+
+    def test_reaper(self):
+        LRUCache = self._load_function(0, 'lru_cache', 'LRUCache')
+
+        cache = LRUCache(size=100, default_ttl=5, reap_interval=0.1)
+        for i in range(50):
+            cache.push(i, i, 1 if i % 2 else 5)
+        sleep(2.2)
+        self.assertEqual(25, len(cache._storage))
+        self.assertEqual(0, cache.get(0))
+        self.assertEqual(None, cache.get(1))
+        cache.stop_reaper()
+
+        self._check_stdout_empty('lru_cache')
+
+    def test_sharded_lrucache(self):
+        ShardedLRUCache = self._load_function(0, 'lru_cache', 'ShardedLRUCache')
+
+        cache = ShardedLRUCache(size=10, default_ttl=5, shards=4)
+        self.assertEqual(4, cache.shards)
+        self.assertEqual(10, sum(s.max_size for s in cache._shards))
+
+        def work(seed):
+            for i in range(1000):
+                key = (seed + i) % 50
+                if cache.get(key) is None:
+                    cache.push(key, key)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(work, range(8)))
+        self.assertTrue(cache.size <= 10)
+
+        cache.push('key', 'value')
+        self.assertEqual('value', cache.get('key'))
+        cache.pop('key')
+        self.assertEqual(None, cache.get('key'))
+
+        self._check_stdout_empty('lru_cache')
+
+    def test_weighted_eviction(self):
+        LRUCache = self._load_function(0, 'lru_cache', 'LRUCache')
+
+        cache = LRUCache(size=10, default_ttl=5, max_bytes=100, weigher=len)
+        cache.push('a', 'x' * 40)
+        cache.push('b', 'x' * 40)
+        self.assertEqual(80, cache.total_bytes)
+        self.assertEqual(40, cache.weight('a'))
+        cache.push('c', 'x' * 50)
+        self.assertEqual(None, cache.get('a'))
+        self.assertEqual(90, cache.total_bytes)
+        cache.push('d', 'x' * 101)
+        self.assertEqual(None, cache.get('d'))
+        cache.push('b', 'x')
+        self.assertEqual(51, cache.total_bytes)
+        self.assertEqual(2, cache.size)
+        self.assertEqual(1, cache.evictions)
+
+        self._check_stdout_empty('lru_cache')
+
+    def test_batch(self):
+        LRUCache = self._load_function(0, 'lru_cache', 'LRUCache')
+        ShardedLRUCache = self._load_function(0, 'lru_cache', 'ShardedLRUCache')
+
+        cache = LRUCache(size=3, default_ttl=5)
+        cache.push_many({1: 'a', 2: 'b', 3: 'c', 4: 'd'})
+        self.assertEqual(3, cache.size)
+        self.assertEqual({1: None, 2: 'b', 3: 'c'}, cache.get_many([1, 2, 3]))
+        cache.push_many({5: 'e'}, ttl=1)
+        self.assertEqual({4: None, 2: 'b', 5: 'e'}, cache.get_many([4, 2, 5]))
+
+        cache = ShardedLRUCache(size=100, default_ttl=5, shards=4)
+        cache.push_many({i: i * i for i in range(50)})
+        self.assertEqual({i: i * i for i in range(10, 0, -1)},
+                         cache.get_many(range(10, 0, -1)))
+
+        self._check_stdout_empty('lru_cache')
+
+    def test_spill(self):
+        LRUCache = self._load_function(0, 'lru_cache', 'LRUCache')
+        SpillFile = self._load_function(0, 'spill', 'SpillFile')
+
+        with tempfile.TemporaryDirectory() as path:
+            spill = SpillFile(path, segment_size=1024)
+            cache = LRUCache(size=2, default_ttl=5, spill=spill)
+            for i in range(100):
+                cache.push(i, 'value-%d' % i)
+            self.assertEqual(98, len(spill))
+            self.assertEqual('value-0', cache.get(0))
+            self.assertEqual(2, cache.size)
+            self.assertEqual(98, len(spill))
+            cache.pop(50)
+            self.assertEqual(None, cache.get(50))
+            for i in range(1, 90):
+                cache.pop(i)
+            spill.compact()
+            self.assertTrue(spill.segments <= 3)
+            self.assertEqual(9, len(spill))
+            spill.close()
+
+            spill = SpillFile(path, segment_size=1024)
+            self.assertEqual(9, len(spill))
+            self.assertEqual(('value-95', spill.get(95)[1]), spill.get(95))
+            self.assertEqual(None, spill.get(50))
+            cache = LRUCache(size=2, default_ttl=5, spill=spill)
+            self.assertEqual('value-95', cache.get(95))
+            spill.close()
+
+        self._check_stdout_empty('lru_cache')
+
 
 if __name__ == '__main__':
     unittest.main()
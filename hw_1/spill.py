@@ -0,0 +1,251 @@
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+
+
+class SpillFile:
+    """Append-only on-disk tier for records evicted from `LRUCache`.
+
+    Records are appended to segment files inside `path` and read back
+    through `mmap`; an in-memory index maps every key to the segment,
+    offset and expiration time of its latest record. Removing a key
+    appends a tombstone, so the index is rebuilt from the segments
+    when the directory is opened again. Sealed segments are rewritten
+    once `compact_ratio` of their bytes is dead.
+    """
+    # kind, expiration time, key length, value length
+    _header = struct.Struct('<BdII')
+    _put = 1
+    _delete = 0
+
+    def __init__(self, path: str, segment_size: int = 64 * 1024 * 1024,
+                 compact_ratio: float = 0.5):
+        assert segment_size > 0, "`segment_size` should be positive."
+        assert 0 < compact_ratio <= 1, \
+            "`compact_ratio` should be in (0, 1]."
+
+        self._path = path
+        self._segment_size = segment_size
+        self._compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._compacting = False
+
+        self._index = dict()
+        self._sizes = dict()
+        self._dead = dict()
+        self._maps = dict()
+
+        os.makedirs(path, exist_ok=True)
+        segments = sorted(int(name.split('.')[0])
+                          for name in os.listdir(path)
+                          if name.endswith('.spill'))
+        for segment in segments:
+            self._load(segment)
+        self._active = segments[-1] if segments else 1
+        self._sizes.setdefault(self._active, 0)
+        self._dead.setdefault(self._active, 0)
+        self._file = open(self._segment_path(self._active), 'ab')
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def segments(self):
+        return len(self._sizes)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        location = self._index.get(key, None)
+        return bool(location) and location[3] >= time.time()
+
+    def put(self, key, value, ttl: float):
+        """Stores the value which expires at the `ttl` timestamp."""
+        with self._lock:
+            self._append(self._put, key, pickle.dumps(value), ttl)
+
+    def get(self, key, default=None):
+        """Returns (value, ttl) of the alive record or `default`."""
+        with self._lock:
+            location = self._index.get(key, None)
+            if not location:
+                return default
+            segment, offset, length, ttl = location
+            if ttl < time.time():
+                self.discard(key)
+                return default
+            view = self._map(segment, offset + length)
+            return pickle.loads(view[offset:offset + length]), ttl
+
+    def take(self, key, default=None):
+        """Returns (value, ttl) of the alive record and removes it."""
+        with self._lock:
+            found = self.get(key, None)
+            if found is None:
+                return default
+            self.discard(key)
+            return found
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._index:
+                self._append(self._delete, key, b'', 0)
+
+    def clear(self):
+        with self._lock:
+            self._file.close()
+            for view in self._maps.values():
+                view.close()
+            for segment in self._sizes:
+                os.remove(self._segment_path(segment))
+            self._index.clear()
+            self._maps.clear()
+            self._active += 1
+            self._sizes = {self._active: 0}
+            self._dead = {self._active: 0}
+            self._file = open(self._segment_path(self._active), 'ab')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            for view in self._maps.values():
+                view.close()
+            self._maps.clear()
+
+    def compact(self):
+        """Rewrites live records of sealed segments with too many dead
+        bytes into the active segment and removes those segments."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            try:
+                # keys of records kept in older segments, tombstones
+                # are carried forward only while they hide one of them
+                older_keys = set()
+                for segment in sorted(self._sizes):
+                    if segment == self._active:
+                        break
+                    if self._dead[segment] >= \
+                            self._sizes[segment] * self._compact_ratio:
+                        self._rewrite(segment, older_keys)
+                    else:
+                        older_keys.update(
+                            key for kind, key, *_ in self._records(segment)
+                            if kind == self._put)
+            finally:
+                self._compacting = False
+
+    def _rewrite(self, segment: int, older_keys: set):
+        now = time.time()
+        for kind, key, ttl, start, offset, length in \
+                list(self._records(segment)):
+            location = self._index.get(key, None)
+            if kind == self._put and location \
+                    and location[:2] == (segment, offset):
+                if ttl < now:
+                    self._index.pop(key)
+                else:
+                    view = self._maps[segment]
+                    self._append(kind, key, view[offset:offset + length], ttl)
+            elif kind == self._delete and key in older_keys \
+                    and key not in self._index:
+                self._append(kind, key, b'', 0)
+        view = self._maps.pop(segment, None)
+        if view:
+            view.close()
+        os.remove(self._segment_path(segment))
+        del self._sizes[segment]
+        del self._dead[segment]
+
+    def _segment_path(self, segment: int):
+        return os.path.join(self._path, f'{segment:08d}.spill')
+
+    def _append(self, kind: int, key, value: bytes, ttl: float):
+        previous = self._index.pop(key, None)
+        if previous:
+            self._dead[previous[0]] += previous[2]
+
+        raw_key = pickle.dumps(key)
+        header = self._header.pack(kind, ttl, len(raw_key), len(value))
+        self._file.write(header)
+        self._file.write(raw_key)
+        self._file.write(value)
+        self._file.flush()
+
+        size = self._sizes[self._active]
+        if kind == self._put:
+            offset = size + len(header) + len(raw_key)
+            self._index[key] = (self._active, offset, len(value), ttl)
+        else:
+            self._dead[self._active] += len(header) + len(raw_key)
+        self._sizes[self._active] = size + len(header) + \
+            len(raw_key) + len(value)
+
+        if self._sizes[self._active] >= self._segment_size:
+            self._roll()
+
+    def _roll(self):
+        self._file.close()
+        self._active += 1
+        self._sizes[self._active] = 0
+        self._dead[self._active] = 0
+        self._file = open(self._segment_path(self._active), 'ab')
+        self.compact()
+
+    def _map(self, segment: int, end: int):
+        """Returns the mapping of the segment covering `end` bytes."""
+        view = self._maps.get(segment, None)
+        if view is None or len(view) < end:
+            if view:
+                view.close()
+            with open(self._segment_path(segment), 'rb') as file:
+                view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment] = view
+        return view
+
+    def _records(self, segment: int):
+        """Yields (kind, key, ttl, record offset, value offset,
+        value length) of every record in the segment."""
+        size = self._sizes[segment]
+        if not size:
+            return
+        view = self._map(segment, size)
+        position = 0
+        while position + self._header.size <= size:
+            start = position
+            kind, ttl, key_length, value_length = \
+                self._header.unpack_from(view, position)
+            if start + self._header.size + key_length + value_length > size:
+                # the tail of a record which wasn't completely written
+                return
+            position += self._header.size
+            key = pickle.loads(view[position:position + key_length])
+            position += key_length
+            yield kind, key, ttl, start, position, value_length
+            position += value_length
+
+    def _load(self, segment: int):
+        self._sizes[segment] = os.path.getsize(self._segment_path(segment))
+        self._dead[segment] = 0
+        end = 0
+        for kind, key, ttl, start, offset, length in self._records(segment):
+            end = offset + length
+            previous = self._index.pop(key, None)
+            if previous:
+                self._dead[previous[0]] += previous[2]
+            if kind == self._put:
+                self._index[key] = (segment, offset, length, ttl)
+            else:
+                self._dead[segment] += offset - start
+        if end < self._sizes[segment]:
+            view = self._maps.pop(segment, None)
+            if view:
+                view.close()
+            os.truncate(self._segment_path(segment), end)
+            self._sizes[segment] = end
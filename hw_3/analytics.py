@@ -0,0 +1,95 @@
+"""
+Link analytics over a graph in CSR form: links of the node `i` are
+`indices[indptr[i]:indptr[i + 1]]`. Every function works with whole
+arrays, sparse products are computed with `np.bincount`.
+"""
+import numpy as np
+
+
+def sources(indptr: np.ndarray) -> np.ndarray:
+    """Source node of every edge."""
+    return np.repeat(np.arange(len(indptr) - 1, dtype=np.int32),
+                     np.diff(indptr))
+
+
+def subgraph(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray):
+    """
+    Keeps the `nodes` (a bool mask) and links between them, nodes
+    are renumbered. Returns (indptr, indices, old ids of nodes).
+    """
+    ids = np.flatnonzero(nodes).astype(np.int32)
+    new_ids = np.cumsum(nodes, dtype=np.int64) - 1
+    edge_sources = sources(indptr)
+    kept = nodes[edge_sources] & nodes[indices]
+    counts = np.bincount(new_ids[edge_sources[kept]], minlength=len(ids))
+    new_indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_indptr[1:])
+    return new_indptr, new_ids[indices[kept]].astype(np.int32), ids
+
+
+def degrees(indptr: np.ndarray, indices: np.ndarray):
+    """Returns (in-degree, out-degree) of every node."""
+    nodes = len(indptr) - 1
+    return np.bincount(indices, minlength=nodes), np.diff(indptr)
+
+
+def log_scores(counts: np.ndarray, scale: float = 10.0) -> np.ndarray:
+    """Logarithm of positive counts normalized to [0, scale],
+    zero counts get zero score."""
+    scores = np.zeros(len(counts), dtype=np.float64)
+    positive = counts > 0
+    scores[positive] = np.log(counts[positive])
+    top = scores.max() if len(scores) else 0
+    if top > 0:
+        scores *= scale / top
+    return scores
+
+
+def pagerank(indptr: np.ndarray, indices: np.ndarray,
+             damping: float = 0.85, tol: float = 1e-10,
+             max_iter: int = 100) -> np.ndarray:
+    """PageRank by power iteration, rank of dangling nodes is spread
+    uniformly over the graph."""
+    nodes = len(indptr) - 1
+    if not nodes:
+        return np.zeros(0)
+    out_degree = np.diff(indptr)
+    dangling = out_degree == 0
+    inverse = np.zeros(nodes)
+    inverse[~dangling] = 1.0 / out_degree[~dangling]
+    edge_sources = sources(indptr)
+
+    rank = np.full(nodes, 1.0 / nodes)
+    for _ in range(max_iter):
+        spread = np.bincount(indices, weights=(rank * inverse)[edge_sources],
+                             minlength=nodes)
+        new_rank = damping * (spread + rank[dangling].sum() / nodes) + \
+            (1 - damping) / nodes
+        delta = np.abs(new_rank - rank).sum()
+        rank = new_rank
+        if delta < nodes * tol:
+            break
+    return rank
+
+
+def hits(indptr: np.ndarray, indices: np.ndarray, tol: float = 1e-10,
+         max_iter: int = 100):
+    """Returns (hubs, authorities) scores, each of them sums to 1."""
+    nodes = len(indptr) - 1
+    if not nodes:
+        return np.zeros(0), np.zeros(0)
+    edge_sources = sources(indptr)
+    hubs = np.full(nodes, 1.0 / nodes)
+    authorities = hubs
+    for _ in range(max_iter):
+        authorities = np.bincount(indices, weights=hubs[edge_sources],
+                                  minlength=nodes)
+        authorities /= authorities.sum() or 1.0
+        new_hubs = np.bincount(edge_sources, weights=authorities[indices],
+                               minlength=nodes)
+        new_hubs /= new_hubs.sum() or 1.0
+        delta = np.abs(new_hubs - hubs).sum()
+        hubs = new_hubs
+        if delta < nodes * tol:
+            break
+    return hubs, authorities
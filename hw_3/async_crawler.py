@@ -0,0 +1,177 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+
+import aiohttp
+
+from hw_3.crawler import Crawler, HEADERS
+from hw_3.frontier import fifo_priority
+from hw_3.links import parse_page
+from hw_3.visited import ExactVisitedSet, VisitedSet
+
+# statuses urllib3 `Retry` repeats when `Retry-After` header is sent
+RETRY_AFTER_STATUSES = frozenset([413, 429, 503])
+
+
+class AsyncCrawler(Crawler):
+    """
+    Crawler which fetches pages with asyncio instead of a thread pool,
+    other keyword arguments (a state, a report, metrics...) are the
+    ones of `Crawler`.
+
+    Up to `concurrency` requests are in flight at once (and up to
+    `per_host` to a single host over pooled keep-alive connections);
+    failed requests are retried with the same exponential backoff
+    and `Retry-After` handling as the urllib3 `Retry` adapter.
+    Pages are parsed in `parsers` worker processes, so parsing doesn't
+    stall requests in flight on the event loop.
+    """
+
+    def __init__(self, base_url: str,
+                 concurrency: int = 200,
+                 per_host: int = 100,
+                 parsers: int = None,
+                 timeout: int = 10,
+                 total_retry_count: int = 3,
+                 backoff_factor: float = 0.5,
+                 visited=ExactVisitedSet,
+                 priority=fifo_priority,
+                 **kwargs):
+        assert concurrency > 0, '`concurrency` should be positive.'
+        assert per_host > 0, '`per_host` should be positive.'
+        parsers = parsers or os.cpu_count() or 1
+        assert parsers > 0, '`parsers` should be positive.'
+        super().__init__(base_url, process_amount=1, timeout=timeout,
+                         total_retry_count=total_retry_count,
+                         backoff_factor=backoff_factor, visited=visited,
+                         priority=priority, **kwargs)
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.parsers = parsers
+        self._parse_pool = None
+        self.total_retry_count = total_retry_count
+        self.backoff_factor = backoff_factor
+
+    def run(self):
+        self.start_metrics()
+        with ProcessPoolExecutor(max_workers=self.parsers) as parse_pool:
+            self._parse_pool = parse_pool
+            try:
+                asyncio.run(self.crawl_all())
+            finally:
+                self._parse_pool = None
+        if self._state is not None:
+            self._state.checkpoint()
+        print(f'Have processed {len(self._processed_pages)} articles.')
+        self.stop_metrics()
+        self._unprocessed_pages.close()
+        self._clean_adj_list()
+        self.generate_report()
+
+    async def crawl_all(self, min_page_count: int = 10000):
+        """Crawls staff pages and then articles, as `Crawler.run` does."""
+        connector = aiohttp.TCPConnector(limit=self.concurrency,
+                                         limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=timeout,
+                                         headers=HEADERS) as session:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await self._drain(
+                session, semaphore, self._unprocessed_staff_pages,
+                self._processed_staff_pages, True,
+                lambda: self._frontier_size() >= min_page_count)
+            print(f'Have processed {len(self._processed_staff_pages)} staff pages.')
+            await self._drain(session, semaphore, self._unprocessed_pages,
+                              self._processed_pages)
+
+    async def _drain(self, session, semaphore, queue, processed: VisitedSet,
+                     is_staff: bool = False, stop=lambda: False):
+        """Crawls urls from the queue until it is empty and nothing
+        is in flight (or `stop` says enough)."""
+        tasks = set()
+        while not stop():
+            try:
+                url = self._take(queue, is_staff, timeout=0)
+            except Empty:
+                if not tasks:
+                    break
+                _, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            if not processed.add(url):
+                continue
+            await semaphore.acquire()
+            task = asyncio.ensure_future(self.crawl_async(session, url, is_staff))
+            task.add_done_callback(lambda _: semaphore.release())
+            tasks.add(task)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def crawl_async(self, session, url: str, is_staff: bool = False):
+        start = time.perf_counter()
+        fetched = await self.fetch_async(session, url)
+        self.metrics.record_time('fetch_latency', time.perf_counter() - start)
+        if not fetched:
+            self.metrics.incr('errors')
+        else:
+            status, text = fetched
+            self.metrics.incr(f'status_{status}')
+            try:
+                if status != 200 or self._parse_pool is None:
+                    self.handle_page(url, status, text, is_staff)
+                    return
+                start = time.perf_counter()
+                found = await asyncio.get_event_loop().run_in_executor(
+                    self._parse_pool, parse_page, text, self.base_url,
+                    is_staff)
+                self.metrics.record_time('parse_latency',
+                                         time.perf_counter() - start)
+                self.store_parsed(url, found, is_staff, text)
+            except Exception as e:
+                print(f'Get Exception: {e}')
+
+    async def fetch_async(self, session, url: str):
+        """Returns (status, text) of the page or None if all attempts
+        have failed."""
+        for attempt in range(self.total_retry_count + 1):
+            last = attempt == self.total_retry_count
+            try:
+                async with session.get(url) as response:
+                    retry_after = response.headers.get('Retry-After', None)
+                    if not last and retry_after is not None and \
+                            response.status in RETRY_AFTER_STATUSES:
+                        self.metrics.incr('retries')
+                        await asyncio.sleep(self._retry_after(retry_after))
+                        continue
+                    body = await response.read()
+                    self.metrics.record('page_bytes', len(body))
+                    self.metrics.incr('bytes', len(body))
+                    return response.status, await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if last:
+                    print(f'Get request exception {e}')
+                    return None
+                self.metrics.incr('retries')
+                await asyncio.sleep(self._backoff(attempt + 1))
+        return None
+
+    def _backoff(self, consecutive_errors: int):
+        """The same backoff urllib3 `Retry` sleeps between attempts."""
+        if consecutive_errors <= 1:
+            return 0
+        return self.backoff_factor * (2 ** (consecutive_errors - 1))
+
+    def _retry_after(self, value: str):
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return self.backoff_factor
+
+
+if __name__ == '__main__':
+    # All articles in Belarusian starting from the letter `п`.
+    crawler = AsyncCrawler('https://be.wikipedia.org/wiki/%D0%90%D0%B4%D0%BC%D1%8B%D1%81%D0%BB%D0%BE%D0%B2%D0%B0%D0%B5:AllPages?from=%D0%BF&to=&namespace=0')
+    crawler.run()
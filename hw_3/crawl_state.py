@@ -0,0 +1,183 @@
+import json
+import sqlite3
+import threading
+
+from hw_3.visited import VisitedSet
+
+
+class CrawlState:
+    """
+    SQLite-backed frontier and visited set of a crawl.
+
+    Every discovered url is stored once with its kind (staff page or
+    article) and whether it has been crawled; links of crawled
+    articles are kept as JSON. Changes become durable on `checkpoint`,
+    which is made after every `checkpoint_every` crawled pages.
+
+    Urls taken for crawling are kept in the `visited` table, so
+    `visited_set` lookups don't hold the crawl in memory.
+    """
+
+    def __init__(self, path: str, base_url: str = None,
+                 checkpoint_every: int = 1000):
+        assert checkpoint_every > 0, '`checkpoint_every` should be positive.'
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self._completed = 0
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                staff INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                links TEXT
+            );
+            CREATE INDEX IF NOT EXISTS pages_frontier
+                ON pages (staff, done);
+            CREATE TABLE IF NOT EXISTS visited (
+                url TEXT NOT NULL,
+                staff INTEGER NOT NULL,
+                PRIMARY KEY (url, staff)
+            );
+        ''')
+        if base_url:
+            self._connection.execute(
+                'INSERT OR IGNORE INTO meta VALUES (?, ?)',
+                ('base_url', base_url))
+            self._connection.commit()
+        # rowid of the last url handed to the in-memory queue per kind
+        self._cursors = {True: 0, False: 0}
+        # uncrawled urls per kind, counted once and then kept up to date
+        self._pending = {
+            staff: self._connection.execute(
+                'SELECT COUNT(*) FROM pages WHERE staff = ? AND done = 0',
+                (int(staff),)).fetchone()[0]
+            for staff in (True, False)
+        }
+
+    @property
+    def base_url(self):
+        row = self._connection.execute(
+            'SELECT value FROM meta WHERE key = ?', ('base_url',)).fetchone()
+        return row[0] if row else None
+
+    def add(self, urls, staff: bool = False):
+        """Adds urls to the frontier, already known ones are ignored."""
+        with self._lock:
+            added = self._connection.executemany(
+                'INSERT OR IGNORE INTO pages (url, staff) VALUES (?, ?)',
+                ((url, int(staff)) for url in urls)).rowcount
+            self._pending[staff] += max(added, 0)
+
+    def complete(self, url: str, links=None):
+        """Marks the url as crawled and stores links found there."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT staff, done FROM pages WHERE url = ?',
+                (url,)).fetchone()
+            self._connection.execute(
+                'UPDATE pages SET done = 1, links = ? WHERE url = ?',
+                (None if links is None else json.dumps(sorted(links)), url))
+            if row is not None and not row[1]:
+                self._pending[bool(row[0])] -= 1
+            self._completed += 1
+            if not self._completed % self.checkpoint_every:
+                self._connection.commit()
+
+    def visited_set(self, staff: bool = False):
+        return StateVisitedSet(self, staff)
+
+    def visit(self, url: str, staff: bool = False) -> bool:
+        """Marks the url as taken, returns True if it hasn't been."""
+        with self._lock:
+            return self._connection.execute(
+                'INSERT OR IGNORE INTO visited VALUES (?, ?)',
+                (url, int(staff))).rowcount == 1
+
+    def is_visited(self, url: str, staff: bool = False) -> bool:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT 1 FROM visited WHERE url = ? AND staff = ?',
+                (url, int(staff))).fetchone() is not None
+
+    def visited_count(self, staff: bool = False) -> int:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT COUNT(*) FROM visited WHERE staff = ?',
+                (int(staff),)).fetchone()[0]
+
+    def reset_visited(self):
+        """Only crawled urls stay visited, urls which were in flight
+        when the crawl stopped are taken again."""
+        with self._lock:
+            self._connection.executescript('''
+                DELETE FROM visited;
+                INSERT INTO visited SELECT url, staff FROM pages WHERE done = 1;
+            ''')
+
+    def pending(self, staff: bool = False):
+        """Amount of urls which haven't been crawled yet."""
+        return self._pending[staff]
+
+    def refill(self, queue, staff: bool = False, limit: int = 10000):
+        """Puts up to `limit` next uncrawled urls into the queue,
+        returns their amount."""
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT rowid, url FROM pages '
+                'WHERE staff = ? AND done = 0 AND rowid > ? '
+                'ORDER BY rowid LIMIT ?',
+                (int(staff), self._cursors[staff], limit)).fetchall()
+        for rowid, url in rows:
+            queue.put(url)
+        if rows:
+            self._cursors[staff] = rows[-1][0]
+        return len(rows)
+
+    def urls(self, staff: bool = False, done: bool = None):
+        """Iterates over urls of the kind without loading all of them."""
+        query = 'SELECT url FROM pages WHERE staff = ?'
+        params = [int(staff)]
+        if done is not None:
+            query += ' AND done = ?'
+            params.append(int(done))
+        for row in self._connection.execute(query, params):
+            yield row[0]
+
+    def adjacency(self):
+        """Iterates over (url, links) of crawled articles."""
+        for url, links in self._connection.execute(
+                'SELECT url, links FROM pages '
+                'WHERE staff = 0 AND done = 1 AND links IS NOT NULL'):
+            yield url, json.loads(links)
+
+    def checkpoint(self):
+        with self._lock:
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+
+class StateVisitedSet(VisitedSet):
+    """Visited urls of one kind looked up in a `CrawlState`."""
+
+    def __init__(self, state: CrawlState, staff: bool = False):
+        self.state = state
+        self.staff = staff
+
+    def add(self, url: str) -> bool:
+        return self.state.visit(url, self.staff)
+
+    def __contains__(self, url):
+        return self.state.is_visited(url, self.staff)
+
+    def __len__(self):
+        return self.state.visited_count(self.staff)
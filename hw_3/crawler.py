@@ -1,19 +1,33 @@
-import math
+import time
 from concurrent.futures import ThreadPoolExecutor, wait
 from queue import Queue, Empty
-from urllib.parse import urljoin
 
-import matplotlib.pyplot as plt
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
 from requests.adapters import HTTPAdapter
 from urllib3 import Retry
 
-
-class StrangeException(Exception):
-    """Exception is raised when Crawler expects staff page
-    but get page of another type."""
-    pass
+from hw_3 import analytics
+from hw_3.crawl_state import CrawlState
+from hw_3.frontier import Frontier, fifo_priority
+from hw_3.graph import LinkGraph, URLIndex
+from hw_3.http_cache import CachingAdapter, HTTPCache
+# StrangeException used to live here, it is still importable from here
+from hw_3.links import StrangeException  # noqa: F401
+from hw_3.links import parse_article, parse_staff_page
+from hw_3.metrics import Metrics, MetricsExporter
+from hw_3.page_store import PageStore
+from hw_3.report import DegreeReport, ReportWriter
+from hw_3.throttle import MAX_CONCURRENCY, AdaptiveConcurrency, \
+    HostRateLimiter
+from hw_3.visited import ExactVisitedSet
+
+# add header to be more polite to the site
+HEADERS = {
+    'user-agent': 'Mozilla/5.0 '
+                  'Macintosh; Intel Mac OS X 10_11_6) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/53.0.2785.143 Safari/537.36'}
 
 
 class Crawler:
@@ -22,25 +36,94 @@ class Crawler:
                  process_amount: int = 4,
                  timeout: int = 10,
                  total_retry_count: int = 3,
-                 backoff_factor: float = 0.5):
+                 backoff_factor: float = 0.5,
+                 state_path: str = None,
+                 checkpoint_every: int = 1000,
+                 frontier_window: int = 10000,
+                 visited=ExactVisitedSet,
+                 cache_path: str = None,
+                 max_concurrency: int = None,
+                 rate_limit: float = None,
+                 burst: int = 1,
+                 report_dir: str = '.',
+                 report_every: int = None,
+                 top: int = 100,
+                 keep_bodies: bool = False,
+                 metrics_interval: float = None,
+                 metrics_path: str = None,
+                 priority=fifo_priority,
+                 pages_path: str = None):
 
         self.base_url = base_url
+        # degree stats are updated as pages finish and written to
+        # `report_dir` every `report_every` articles and after the run
+        self.report_dir = report_dir
+        self.report_every = report_every
+        self._report = DegreeReport(top)
+        self.frontier_window = frontier_window
         self.timeout = timeout
-        self._pool = ThreadPoolExecutor(max_workers=process_amount)
+        # keep compressed bodies of articles in `_pages` (blobs in
+        # `pages_path`, a temporary directory removed by `close` by
+        # default) for a later parse stage
+        self.keep_bodies = keep_bodies
+        # fetches in flight start at `process_amount` and adapt up to
+        # `max_concurrency`, every host gets `rate_limit` requests/s
+        max_concurrency = max(max_concurrency or MAX_CONCURRENCY,
+                              process_amount)
+        self._concurrency = AdaptiveConcurrency(process_amount,
+                                                maximum=max_concurrency)
+        self._limiter = HostRateLimiter(rate_limit, burst) \
+            if rate_limit else None
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency)
         self._works = []
 
-        self._processed_pages = set()
-        self._unprocessed_pages = Queue()
+        # `visited` makes a VisitedSet, e.g. a bounded BloomVisitedSet
+        # for very large crawls
+        self._processed_pages = visited()
+        # articles are fetched in order of `priority` (lower goes first),
+        # over `frontier_window` urls are spilled to the disk
+        self._priority = priority
+        self._unprocessed_pages = Frontier(priority, frontier_window)
 
-        self._processed_staff_pages = set()
+        self._processed_staff_pages = visited()
         self._unprocessed_staff_pages = Queue()
         self._unprocessed_staff_pages.put(base_url)
 
-        self._adjacency_list = dict()
-        self._counter = dict()
-        self._pages = dict()
+        # with `metrics_interval` snapshots of metrics are written to
+        # `metrics_path` (or stdout) during the run
+        self.metrics = Metrics()
+        self.metrics.gauge('frontier', self._unprocessed_pages.qsize)
+        self.metrics.gauge('staff_frontier',
+                           self._unprocessed_staff_pages.qsize)
+        self.metrics.gauge('in_flight', lambda: self._concurrency.in_flight)
+        self.metrics.gauge('concurrency_limit',
+                           lambda: self._concurrency.limit)
+        self._exporter = None
+        if metrics_interval:
+            self._exporter = MetricsExporter(self.metrics, metrics_interval,
+                                             metrics_path)
+
+        # every url is interned once, links are kept as url ids
+        self._urls = URLIndex()
+        # snapshots are written by one thread, not in fetch slots
+        self._report_writer = ReportWriter(self._report, report_dir,
+                                           self._urls)
+        self._adjacency_list = LinkGraph(self._urls)
+        # known articles, with bodies if `keep_bodies`
+        self._pages = PageStore(self._urls, pages_path)
         self._staff_pages = []
 
+        # with a state the frontier lives on disk and queues are refilled
+        # from it in batches
+        self._state = None
+        if state_path:
+            self._state = CrawlState(state_path, base_url, checkpoint_every)
+            self._state.add([base_url], staff=True)
+            # visited urls are looked up in the state instead of `visited`
+            self._state.reset_visited()
+            self._processed_pages = self._state.visited_set()
+            self._processed_staff_pages = self._state.visited_set(True)
+
         retry = Retry(
             total=total_retry_count,
             read=total_retry_count,
@@ -48,7 +131,14 @@ class Crawler:
             backoff_factor=backoff_factor,
             respect_retry_after_header=True
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        # with a cache unchanged pages are revalidated with conditional
+        # GETs and their links aren't parsed again
+        self._cache = None
+        if cache_path:
+            self._cache = HTTPCache(cache_path)
+            adapter = CachingAdapter(self._cache, max_retries=retry)
+        else:
+            adapter = HTTPAdapter(max_retries=retry)
         session = requests.Session()
         session.mount('http://', adapter)
         session.mount('https://', adapter)
@@ -62,12 +152,56 @@ class Crawler:
     def unprocessed_pages(self):
         return self._unprocessed_pages
 
+    @property
+    def concurrency_limit(self):
+        """Current limit of fetches in flight."""
+        return self._concurrency.limit
+
+    @property
+    def cache_stats(self):
+        """Hits, misses, hit rate and saved bytes of the HTTP cache."""
+        return self._cache.stats() if self._cache is not None else None
+
+    @classmethod
+    def resume(cls, path: str, **kwargs):
+        """
+        Restores the crawl saved at `path` with `state_path`,
+        crawled pages aren't fetched again.
+
+        The frontier and visited urls stay on the disk, but the link
+        graph of crawled articles is loaded back into memory and every
+        known article url is interned, so memory grows with the amount
+        of articles (as it does during the crawl).
+        """
+        state = CrawlState(path)
+        base_url = state.base_url
+        state.close()
+        assert base_url, f'There is no crawl saved at {path}.'
+
+        crawler = cls(base_url, state_path=path, **kwargs)
+        state = crawler._state
+        for url in state.urls(False):
+            crawler._pages[url] = ''
+        for url, links in state.adjacency():
+            crawler.store_links(url, links)
+        return crawler
+
+    def _take(self, queue, is_staff: bool = False, timeout: float = 2):
+        """Next url of the queue, refilled from the state when empty."""
+        if self._state is not None and queue.empty():
+            self._state.refill(queue, is_staff, self.frontier_window)
+        return queue.get(timeout=timeout)
+
+    def _frontier_size(self):
+        if self._state is not None:
+            return self._state.pending()
+        return self._unprocessed_pages.qsize()
+
     def _run_staff(self, min_page_count: int = 10000):
-        while self._unprocessed_pages.qsize() < min_page_count:
+        while self._frontier_size() < min_page_count:
             try:
-                url = self._unprocessed_staff_pages.get(timeout=2)
-                if url not in self._processed_staff_pages:
-                    self._processed_staff_pages.add(url)
+                url = self._take(self._unprocessed_staff_pages, True)
+                if self._processed_staff_pages.add(url):
                     self._works.append(self._pool.submit(self.crawl, url, True))
             except Empty:
                 break
@@ -78,9 +212,8 @@ class Crawler:
     def _run_articles(self):
         while True:
             try:
-                url = self._unprocessed_pages.get(timeout=2)
-                if url not in self._processed_pages:
-                    self._processed_pages.add(url)
+                url = self._take(self._unprocessed_pages)
+                if self._processed_pages.add(url):
                     self._works.append(self._pool.submit(self.crawl, url))
             except Empty:
                 break
@@ -88,124 +221,246 @@ class Crawler:
                 print(f'Get Exception2: {e}')
 
     def run(self):
+        self.start_metrics()
         self._run_staff()
         wait(self._works)
         self._works = []
         self._run_articles()
         wait(self._works)
+        if self._state is not None:
+            self._state.checkpoint()
         print(f'Have processed {len(self._processed_pages)} articles.')
+        if self._cache is not None:
+            print(f'HTTP cache: {self._cache.stats()}.')
+        self.stop_metrics()
+        self._unprocessed_pages.close()
         self._clean_adj_list()
         self.generate_report()
 
-    def generate_report(self):
-        """Generates not the best version of bar for representing
-        [(links amount)/page] relations."""
-
-        self._pool.map(self._normalize, self._pages)
-        pl_max = max(self._counter.values())
-        results = {key: (value * 10.0 / pl_max) for key, value
-                   in self._counter.items()}
-        plt.bar(results.keys(), results.values(), color='g', width=1)
-        plt.xlabel('Pages')
-        plt.ylabel('Links count')
-        plt.xticks(rotation='vertical')
-        plt.savefig('bar.png')
-        plt.show()
-
-    def _normalize(self, url):
-        self._counter[url] = math.log(self._counter[url])
+    def close(self):
+        """
+        Closes the fetch pool, the frontier, the page store, the HTTP
+        cache and the state. `run` doesn't close the crawler, so kept
+        bodies can be parsed after it, but without `pages_path` they
+        are kept in a temporary directory which only `close` removes.
+        """
+        self._report_writer.stop()
+        self._pool.shutdown()
+        self._unprocessed_pages.close()
+        self._pages.close()
+        self._session.close()
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+        if self._state is not None:
+            self._state.close()
+            self._state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_metrics(self):
+        if self._exporter is not None:
+            self._exporter.start()
+
+    def stop_metrics(self):
+        """Stops the exporter, the last snapshot is exported."""
+        if self._exporter is not None:
+            self._exporter.stop()
+
+    def generate_report(self, image: bool = True):
+        """Writes degree histograms and top pages by in-degree as
+        JSON/CSV and, with `image`, a headless plot of the histograms."""
+        self._report_writer.stop()
+        self._report.write(self.report_dir, self._urls, image)
+
+    def analyze(self, damping: float = 0.85):
+        """
+        Link analytics of the crawled graph (call after `run`):
+        arrays of in/out-degree, log-normalized in-degree, PageRank,
+        HITS hubs and authorities aligned with the `urls` list.
+        """
+        indptr, indices, ids = analytics.subgraph(
+            self._adjacency_list.indptr, self._adjacency_list.indices,
+            self._adjacency_list.nodes())
+        in_degree, out_degree = analytics.degrees(indptr, indices)
+        hubs, authorities = analytics.hits(indptr, indices)
+        return {
+            'urls': [self._urls.url(i) for i in ids],
+            'in_degree': in_degree,
+            'out_degree': out_degree,
+            'score': analytics.log_scores(in_degree),
+            'pagerank': analytics.pagerank(indptr, indices, damping),
+            'hubs': hubs,
+            'authorities': authorities,
+        }
 
     def _clean_adj_list(self):
         """
         Remove links to pages that haven't arrived in staff pages,
-        (they are not presented in graph) and count links per each page
-        in graph
+        (they are not presented in graph)
         """
 
-        for page in self._pages:
-            adj_list = self._adjacency_list[page]
-            adj_list = [link for link in adj_list if link in self._pages]
-            for link in adj_list:
-                counter = self._counter.get(link, None)
-                if not counter:
-                    self._counter[link] = 0
-                self._counter[link] += 1
-            self._adjacency_list[page] = adj_list
+        in_graph = np.zeros(len(self._urls), dtype=bool)
+        in_graph[self._pages.ids()] = True
+        self._adjacency_list.restrict(in_graph)
+
+    def fetch(self, url: str):
+        """GETs the url within the rate and concurrency limits."""
+        self._concurrency.acquire()
+        status = None
+        start = time.perf_counter()
+        try:
+            if self._limiter is not None:
+                self._limiter.acquire(url)
+                start = time.perf_counter()
+            response = self._session.get(url, headers=HEADERS, timeout=self.timeout)
+            status = response.status_code
+            self._count_response(response)
+            return response
+        finally:
+            latency = time.perf_counter() - start
+            self._concurrency.release(latency, status)
+            self.metrics.record_time('fetch_latency', latency)
+            if status is None:
+                self.metrics.incr('errors')
+
+    def _count_response(self, response):
+        self.metrics.incr(f'status_{response.status_code}')
+        retries = getattr(response.raw, 'retries', None)
+        if retries is not None and retries.history:
+            self.metrics.incr('retries', len(retries.history))
+        if not getattr(response, 'from_cache', False):
+            self.metrics.record('page_bytes', len(response.content))
+            self.metrics.incr('bytes', len(response.content))
 
     def crawl(self, url: str, is_staff: bool = False):
-        # add header to be more polite to the site
-        headers = {
-            'user-agent': 'Mozilla/5.0 '
-                          'Macintosh; Intel Mac OS X 10_11_6) '
-                          'AppleWebKit/537.36 (KHTML, like Gecko) '
-                          'Chrome/53.0.2785.143 Safari/537.36'}
         try:
-            response = self._session.get(url, headers=headers, timeout=self.timeout)
-            if response.status_code == 200:
-                if is_staff:
-                    self.find_staff_links(response)
-                else:
-                    self.find_links(url, response)
-            else:
-                print(f'Page {url} return status {response.status_code}.')
-                print(f'Text: {response.text}.')
+            response = self.fetch(url)
+            if not self.reuse_links(url, response, is_staff):
+                self.handle_page(url, response.status_code, response.text,
+                                 is_staff)
         except requests.RequestException as e:
             print(f'Get request exception {e}')
 
+    def reuse_links(self, url: str, response, is_staff: bool = False):
+        """Stores links of an unchanged article parsed on a previous
+        crawl, returns False if the page should be parsed."""
+        if is_staff or not getattr(response, 'from_cache', False):
+            return False
+        links = self._cache.links(url)
+        if links is None:
+            return False
+        if self.keep_bodies:
+            self._pages[url] = response.text
+        self.store_links(url, links)
+        self.page_done(url)
+        return True
+
+    def handle_page(self, url: str, status: int, text: str,
+                    is_staff: bool = False):
+        """Processes the fetched page whatever way it was fetched."""
+        if status == 200:
+            start = time.perf_counter()
+            if is_staff:
+                self.add_staff_links(text)
+            else:
+                self.add_links(url, text)
+            self.metrics.record_time('parse_latency',
+                                     time.perf_counter() - start)
+            self.page_done(url, is_staff)
+        else:
+            print(f'Page {url} return status {status}.')
+            print(f'Text: {text}.')
+
+    def store_parsed(self, url: str, found, is_staff: bool = False,
+                     text: str = None):
+        """Stores what `links.parse_page` has found in the page parsed
+        elsewhere, e.g. in a worker process."""
+        if is_staff:
+            if found:
+                self.store_staff_links(*found)
+            else:
+                print(f'Can\'t find main_content in page.')
+        else:
+            if self.keep_bodies and text is not None:
+                self._pages[url] = text
+            self.store_links(url, found)
+        self.page_done(url, is_staff)
+
+    def page_done(self, url: str, is_staff: bool = False):
+        """Records the crawled page in the state of the crawl."""
+        self.metrics.incr('staff_pages' if is_staff else 'articles')
+        if self._state is not None:
+            links = None if is_staff else self._adjacency_list.get(url, ())
+            self._state.complete(url, links)
+
     def find_staff_links(self, page):
         """
         Find unprocessed staff urls and article urls in the current page.
         """
-        soup = BeautifulSoup(page.text, 'html.parser')
-        main_content = soup.find("div", {"id": "content"})
-        if not main_content:
+        self.add_staff_links(page.text)
+
+    def add_staff_links(self, text: str):
+        found = parse_staff_page(text, self.base_url)
+        if not found:
             print(f'Can\'t find main_content in page.')
             return
-        soup = main_content
-        all_pages = soup.find("div", {"class": "mw-allpages-body"})
-        staff_page = True if all_pages else False
-        if not staff_page:
-            print('Strange staff page without all_pages.')
-            raise StrangeException()
-        links = all_pages.find_all('a', href=True)
-        for link in links:
-            url = link['href']
-            # check that link is to the current site
-            if url.startswith('/wiki') or url.startswith(self.base_url):
-                url = urljoin(self.base_url, url)
-                if url not in self.processed_pages:
-                    self._unprocessed_pages.put(url)
-                    self._pages[url] = ''
-
+        self.store_staff_links(*found)
+
+    def store_staff_links(self, articles, staff_pages):
+        """Enqueues unprocessed article and staff urls."""
+        articles = [url for url in articles if url not in self.processed_pages]
+        staff_pages = [url for url in staff_pages
+                       if url not in self._processed_staff_pages]
+        for url in articles:
+            self._pages[url] = ''
+        if self._state is not None:
+            self._state.add(articles)
+            self._state.add(staff_pages, staff=True)
+
+        self._enqueue(self._unprocessed_pages, articles)
         # search for new staff urls
-        navigation = soup.find("div", {"class": "mw-allpages-nav"})
-        nav_a = navigation.findChildren("a", recursive=False)
-        for link in nav_a:
-            url = urljoin(self.base_url, link['href'])
-            if url not in self._processed_staff_pages:
-                self._unprocessed_staff_pages.put(url)
+        self._enqueue(self._unprocessed_staff_pages, staff_pages)
+
+    def _enqueue(self, queue, urls):
+        """With a state only a window of the frontier is kept in memory,
+        the rest is refilled from the disk."""
+        for url in urls:
+            if self._state is not None and \
+                    queue.qsize() >= self.frontier_window:
+                break
+            queue.put(url)
 
     def find_links(self, current_url: str, response):
         """
         Find unprocessed article links.
         """
-        page = response.text
-        soup = BeautifulSoup(page, 'html.parser')
-        main_content = soup.find("div", {"id": "content"})
-
-        # remove links that don't have straight connection to the article
-        footer_links = main_content.find_all('div', {'id': 'catlinks'})
-        for link in footer_links:
-            link.extract()
-
-        links = main_content.find_all('a', href=True)
-        adj_list = set()
-        for link in links:
-            url = link['href']
-            if 'wiki' in url:
-                url = urljoin(self.base_url, url)
-                adj_list.add(url)
-        self._adjacency_list[current_url] = adj_list
+        self.add_links(current_url, response.text)
+
+    def add_links(self, current_url: str, text: str):
+        if self.keep_bodies:
+            self._pages[current_url] = text
+        self.store_links(current_url, parse_article(text, self.base_url))
+
+    def store_links(self, current_url: str, links):
+        links = set(links)
+        self._adjacency_list[current_url] = links
+        observe = getattr(self._priority, 'observe', None)
+        if observe is not None:
+            observe(links)
+            # queued urls are re-scored with the new counts
+            self._unprocessed_pages.update(links)
+        if self._cache is not None:
+            self._cache.store_links(current_url, links)
+        pages = self._report.add(self._urls.id(current_url),
+                                 [self._urls.id(link) for link in links
+                                  if link in self._pages])
+        if self.report_every and not pages % self.report_every:
+            self._report_writer.request()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+import os
+import time
+import tracemalloc
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+
+from hw_3 import analytics
+from hw_3.links import parse_article, parse_article_soup
+from hw_3.parser import WikiParser
+from hw_3.synthetic_wiki import STAFF_PATH, build_wiki
+from hw_3.visited import BloomVisitedSet, ExactVisitedSet
+
+BASE_URL = 'http://127.0.0.1' + STAFF_PATH
+
+
+def _articles(pages: dict):
+    return [text for path, text in pages.items() if 'Article_' in path
+            and 'AllPages' not in path]
+
+
+def bench_link_extraction(articles: int = 500, links: int = 50,
+                          padding: int = 40):
+    """Compares the streaming and the soup link extractors on the
+    synthetic wiki: returns {name: (pages/s, peak bytes per page)}."""
+    bodies = _articles(build_wiki(articles, links, padding=padding))
+    for body in bodies:
+        assert parse_article(body, BASE_URL) == \
+            parse_article_soup(body, BASE_URL), 'extractors disagree'
+
+    results = {}
+    for name, parse in (('stream', parse_article),
+                        ('soup', parse_article_soup)):
+        start = time.perf_counter()
+        for body in bodies:
+            parse(body, BASE_URL)
+        throughput = len(bodies) / (time.perf_counter() - start)
+
+        tracemalloc.start()
+        parse(bodies[0], BASE_URL)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (throughput, peak)
+    return results
+
+
+def run_link_extraction():
+    print(f'{"extractor":>10} {"pages/s":>10} {"peak KiB/page":>14}')
+    for name, (throughput, peak) in bench_link_extraction().items():
+        print(f'{name:>10} {throughput:>10.1f} {peak / 1024:>14.1f}')
+
+
+def bench_wiki_parser(articles: int = 5000, links: int = 50,
+                      non_articles: int = 500, padding: int = 10):
+    """Parses the synthetic corpus with 1 and all cpus: returns
+    {process amount: pages/s}."""
+    pages = {'http://127.0.0.1' + path: body for path, body in build_wiki(
+        articles, links, padding=padding, non_articles=non_articles).items()
+             if 'Article_' in path and 'AllPages' not in path}
+    results = {}
+    for process_amount in sorted({1, os.cpu_count() or 1}):
+        parser = WikiParser(BASE_URL, process_amount)
+        parser.pages = pages
+        for url in pages:
+            parser.unprocessed_pages.put(url)
+        start = time.perf_counter()
+        with mock.patch('sys.stdout', new=StringIO()):
+            parser.run()
+        results[process_amount] = len(pages) / (time.perf_counter() - start)
+    return results
+
+
+def run_wiki_parser():
+    print(f'{"processes":>10} {"pages/s":>10}')
+    for process_amount, throughput in bench_wiki_parser().items():
+        print(f'{process_amount:>10} {throughput:>10.1f}')
+
+
+def random_graph(nodes: int, edges: int, seed: int = 0):
+    """CSR arrays of a random graph with skewed in-degrees."""
+    random = np.random.RandomState(seed)
+    edge_sources = np.sort(random.randint(0, nodes, edges))
+    targets = (random.pareto(1.5, edges) * nodes / 50).astype(np.int64) % nodes
+    indptr = np.zeros(nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edge_sources, minlength=nodes), out=indptr[1:])
+    return indptr, targets.astype(np.int32)
+
+
+def run_analytics(nodes: int = 1000000, edges: int = 10000000):
+    indptr, indices = random_graph(nodes, edges)
+    print(f'{nodes} nodes, {edges} edges')
+    for name, compute in (
+            ('degrees', lambda: analytics.degrees(indptr, indices)),
+            ('log scores', lambda: analytics.log_scores(
+                analytics.degrees(indptr, indices)[0])),
+            ('pagerank', lambda: analytics.pagerank(indptr, indices)),
+            ('hits', lambda: analytics.hits(indptr, indices))):
+        start = time.perf_counter()
+        compute()
+        print(f'{name:>12} {time.perf_counter() - start:>8.2f} s')
+
+
+def _url(i: int) -> str:
+    return f'https://be.wikipedia.org/wiki/Article_{i:09d}'
+
+
+def bench_visited(count: int = 10000000, error_rate: float = 0.001):
+    """Adds `count` urls to every visited set: returns {name: (adds/s,
+    bytes per url, false positive rate over `count` // 10 unseen urls)}.
+    Memory is traced on a tenth of urls, tracing slows down adding."""
+    results = {}
+    for name, make in (
+            ('exact', lambda capacity: ExactVisitedSet()),
+            ('bloom', lambda capacity: BloomVisitedSet(capacity, error_rate))):
+        sample = count // 10
+        tracemalloc.start()
+        visited = make(sample)
+        for i in range(sample):
+            visited.add(_url(i))
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del visited
+
+        visited = make(count)
+        start = time.perf_counter()
+        for i in range(count):
+            visited.add(_url(i))
+        throughput = count / (time.perf_counter() - start)
+        false_positives = sum(_url(i) in visited
+                              for i in range(count, count + sample))
+        results[name] = (throughput, size / sample, false_positives / sample)
+        del visited
+    return results
+
+
+def run_visited(count: int = 10000000):
+    print(f'{count} urls')
+    print(f'{"visited":>10} {"adds/s":>10} {"B/url":>8} {"fp rate":>8}')
+    for name, (throughput, size, rate) in bench_visited(count).items():
+        print(f'{name:>10} {throughput:>10.0f} {size:>8.1f} {rate:>8.4f}')
+
+
+if __name__ == '__main__':
+    run_link_extraction()
+    run_wiki_parser()
+    run_analytics()
+    run_visited()
@@ -0,0 +1,549 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from io import StringIO
+from queue import Empty
+from unittest import mock
+
+import numpy as np
+import requests
+
+from hw_3 import analytics
+from hw_3.async_crawler import AsyncCrawler
+from hw_3.crawl_state import StateVisitedSet
+from hw_3.crawler import Crawler
+from hw_3.frontier import Frontier, InDegreePriority, \
+    RecrawlAgePriority, depth_priority
+from hw_3.graph import LinkGraph
+from hw_3.http_cache import CachingAdapter, HTTPCache
+from hw_3.links import parse_article, parse_article_soup
+from hw_3.metrics import Histogram
+from hw_3.page_store import PageStore
+from hw_3.parser import WikiParser
+from hw_3.pipeline import PipelineCrawler
+from hw_3.synthetic_wiki import WikiServer, article_links, article_title, \
+    build_wiki
+from hw_3.throttle import AdaptiveConcurrency, TokenBucket
+from hw_3.visited import BloomVisitedSet, ExactVisitedSet
+
+
+class CrawlerTestCase(unittest.TestCase):
+    def setUp(self):
+        self._stdout_mock = self._setup_stdout_mock()
+        patcher = mock.patch.object(Crawler, 'generate_report')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _setup_stdout_mock(self):
+        patcher = mock.patch('sys.stdout', new=StringIO())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return patcher.new
+
+    def _expected_adjacency(self, server, articles, links):
+        return {
+            f'{server.root}/wiki/{article_title(i)}':
+                {f'{server.root}/wiki/{article_title(j)}'
+                 for j in article_links(i, articles, links)}
+            for i in range(articles)
+        }
+
+    def test_streaming_extractor(self):
+        base_url = 'http://localhost/wiki/Special:AllPages'
+        pages = list(build_wiki(articles=30, links=8, padding=2).values())
+        pages.append(
+            '<div id="content"><a href="/wiki/A?x=1&amp;y=2">a</a>'
+            '<div><div id="catlinks"><a href="/wiki/C">c</a></div>'
+            '<a href="/wiki/B">b</a><a>no href</a></div></div>'
+            '<a href="/wiki/Outside">o</a>')
+        pages.append('<p><a href="/wiki/A">no content</a></p>')
+        for page in pages:
+            self.assertEqual(parse_article_soup(page, base_url),
+                             parse_article(page, base_url))
+
+    def test_wiki_parser(self):
+        pages = build_wiki(articles=100, links=8, non_articles=10)
+        root = 'http://wiki'
+        expected = {
+            f'{root}/wiki/{article_title(i)}':
+                {f'{root}/wiki/{article_title(j)}'
+                 for j in article_links(i, 100, 8) if j < 90}
+            for i in range(90)
+        }
+        for process_amount in (1, 2):
+            parser = WikiParser(root + '/wiki/', process_amount,
+                                chunk_size=7)
+            parser.pages = {root + path: body for path, body in pages.items()
+                            if 'Article_' in path and 'AllPages' not in path}
+            for url in parser.pages:
+                parser.unprocessed_pages.put(url)
+            parser.run()
+            self.assertEqual(expected, parser.adjacency_list)
+            self.assertEqual(100, len(parser.processed_pages))
+
+    def test_frontier(self):
+        frontier = Frontier(lambda url: int(url.rsplit('/', 1)[1]) % 10,
+                            memory_limit=20, batch=5)
+        urls = [f'http://host{i % 3}/page/{i}' for i in range(300)]
+        for url in urls:
+            frontier.put(url)
+        self.assertEqual(300, frontier.qsize())
+        self.assertGreater(frontier.spilled, 0)
+        taken = [frontier.get_nowait() for _ in range(300)]
+        self.assertEqual(sorted(urls), sorted(taken))
+        self.assertEqual(['host0', 'host1', 'host2'] * 2,
+                         [url.split('/')[2] for url in taken[:6]])
+        for host in ('host0', 'host1', 'host2'):
+            pages = [int(url.rsplit('/', 1)[1]) for url in taken
+                     if f'//{host}/' in url]
+            self.assertEqual(sorted(pages, key=lambda page: (page % 10, page)),
+                             pages)
+        with self.assertRaises(Empty):
+            frontier.get(timeout=0.01)
+        frontier.close()
+
+        frontier = Frontier(RecrawlAgePriority({'http://a/1': 1.0}))
+        for url in ('http://a/1', 'http://a/b/c/2', 'http://a/3'):
+            frontier.put(url)
+        self.assertEqual(['http://a/b/c/2', 'http://a/3', 'http://a/1'],
+                         [frontier.get() for _ in range(3)])
+        self.assertEqual(2, depth_priority('http://a/wiki/Article_1'))
+
+        # queued urls are re-scored as links to them are observed
+        priority = InDegreePriority()
+        frontier = Frontier(priority, memory_limit=4, batch=2)
+        urls = [f'http://a/{i}' for i in range(8)]
+        for url in urls:
+            frontier.put(url)
+        self.assertGreater(frontier.spilled, 0)
+        links = [urls[2]] * 5 + [urls[7]] * 3 + [urls[5]]
+        priority.observe(links)
+        frontier.update(links)
+        self.assertEqual(8, frontier.qsize())
+        self.assertEqual([urls[i] for i in (2, 7, 5, 0, 1, 3, 4, 6)],
+                         [frontier.get_nowait() for _ in range(8)])
+        frontier.close()
+
+        with WikiServer(build_wiki(articles=60, links=5)) as server:
+            for priority in (depth_priority, InDegreePriority()):
+                crawler = Crawler(server.base_url, frontier_window=10,
+                                  priority=priority)
+                crawler.run()
+                self.assertEqual(self._expected_adjacency(server, 60, 5),
+                                 {url: set(links) for url, links
+                                  in crawler._adjacency_list.items()})
+
+    def test_page_store(self):
+        pages = {f'http://wiki/wiki/{path}': body for path, body in
+                 build_wiki(articles=50, links=5, padding=20).items()}
+        store = PageStore(blob_size=10000)
+        for url, body in pages.items():
+            store[url] = body
+        store['http://wiki/unknown'] = ''
+        self.assertGreater(len(os.listdir(store.path)), 1)
+        self.assertLess(store.stored_bytes, store.raw_bytes / 5)
+        self.assertEqual(len(pages) + 1, len(store))
+        self.assertEqual(set(pages) | {'http://wiki/unknown'}, set(store))
+        for url, body in pages.items():
+            self.assertEqual(body, store[url])
+        self.assertEqual('', store['http://wiki/unknown'])
+        self.assertIsInstance(store.raw(url), memoryview)
+        del store[url]
+        self.assertNotIn(url, store)
+        with self.assertRaises(KeyError):
+            store.raw(url)
+        path = store.path
+        store.close()
+        self.assertFalse(os.path.exists(path))
+
+        # a store in the path of a previous one doesn't overwrite its blobs
+        with tempfile.TemporaryDirectory() as path:
+            store = PageStore(path=path)
+            store['http://wiki/a'] = 'a' * 100
+            store.close()
+            blob = os.path.join(path, '00000001.blob')
+            size = os.path.getsize(blob)
+            store = PageStore(path=path)
+            store['http://wiki/b'] = 'b'
+            self.assertEqual('b', store['http://wiki/b'])
+            store.close()
+            self.assertEqual(size, os.path.getsize(blob))
+            self.assertEqual(['00000001.blob', '00000002.blob'],
+                             sorted(os.listdir(path)))
+
+        with WikiServer(build_wiki(articles=40, links=5,
+                                   non_articles=5)) as server:
+            with Crawler(server.base_url, keep_bodies=True) as crawler:
+                crawler.run()
+                url = f'{server.root}/wiki/{article_title(3)}'
+                self.assertEqual(server.pages[f'/wiki/{article_title(3)}'],
+                                 crawler._pages[url])
+                parser = WikiParser(server.base_url, 2)
+                parser.pages = crawler._pages
+                for url in crawler._pages:
+                    parser.unprocessed_pages.put(url)
+                parser.run()
+                self.assertEqual(35, len(parser.adjacency_list))
+                path = crawler._pages.path
+                self.assertTrue(os.path.exists(path))
+            # the temporary directory of bodies is removed on close
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(crawler._pool._shutdown)
+
+    def test_link_graph(self):
+        graph = LinkGraph()
+        graph['a'] = {'b', 'c', 'x'}
+        graph['b'] = {'c'}
+        graph.freeze()
+        graph['c'] = {'a', 'b'}
+        graph['b'] = {'a', 'c'}
+        self.assertEqual({'a': {'b', 'c', 'x'}, 'b': {'a', 'c'}, 'c': {'a', 'b'}},
+                         {url: set(links) for url, links in graph.items()})
+        self.assertEqual(np.int32, graph.indices.dtype)
+
+        nodes = np.array([url != 'x' for url in graph.urls])
+        graph.restrict(nodes)
+        in_degree = graph.in_degree()
+        self.assertEqual([2, 2, 2, 0],
+                         [in_degree[graph.urls.id(url)] for url in 'abcx'])
+        self.assertEqual(['b', 'c'], sorted(graph['a']))
+
+    def test_analytics(self):
+        # 0 -> 1, 0 -> 2, 1 -> 2, 2 -> 0, 3 -> 2, 4 is dangling
+        indptr = np.array([0, 2, 3, 4, 5, 5])
+        indices = np.array([1, 2, 2, 0, 2], dtype=np.int32)
+        in_degree, out_degree = analytics.degrees(indptr, indices)
+        self.assertEqual([1, 1, 3, 0, 0], list(in_degree))
+        self.assertEqual([2, 1, 1, 1, 0], list(out_degree))
+        self.assertEqual(10.0, analytics.log_scores(in_degree)[2])
+
+        links = {0: [1, 2], 1: [2], 2: [0], 3: [2], 4: []}
+        rank = {node: 0.2 for node in links}
+        for _ in range(100):
+            dangling = sum(rank[node] for node in links if not links[node])
+            rank = {node: 0.03 + 0.85 * (dangling / 5 + sum(
+                rank[source] / len(links[source])
+                for source in links if node in links[source]))
+                for node in links}
+        np.testing.assert_allclose([rank[node] for node in range(5)],
+                                   analytics.pagerank(indptr, indices))
+
+        hubs, authorities = analytics.hits(indptr, indices)
+        self.assertEqual(2, int(np.argmax(authorities)))
+        self.assertAlmostEqual(1.0, hubs.sum())
+
+    def test_crawler(self):
+        with WikiServer(build_wiki(articles=60, links=5)) as server:
+            crawler = Crawler(server.base_url)
+            crawler.run()
+            adjacency = {url: set(links) for url, links
+                         in crawler._adjacency_list.items()}
+            self.assertEqual(self._expected_adjacency(server, 60, 5),
+                             adjacency)
+            results = crawler.analyze()
+            self.assertEqual(60, len(results['urls']))
+            self.assertAlmostEqual(1.0, results['pagerank'].sum())
+
+    def test_visited_sets(self):
+        urls = [f'http://wiki/{i}' for i in range(1000)]
+        exact, bloom = ExactVisitedSet(), BloomVisitedSet(1000, 0.01)
+        self.assertTrue(all(exact.add(url) for url in urls))
+        # a new url may be a false positive of the filter
+        self.assertLess(1000 - sum(bloom.add(url) for url in urls), 30)
+        for visited in (exact, bloom):
+            self.assertFalse(any(visited.add(url) for url in urls))
+            self.assertTrue(all(url in visited for url in urls))
+        self.assertEqual(1000, len(exact))
+        false_positives = sum(f'http://wiki/{i}' in bloom
+                              for i in range(1000, 11000))
+        self.assertLess(false_positives, 300)
+
+        with WikiServer(build_wiki(articles=60, links=5)) as server:
+            crawler = Crawler(server.base_url,
+                              visited=lambda: BloomVisitedSet(1000, 0.001))
+            crawler.run()
+            self.assertEqual(60, len(crawler.processed_pages))
+            self.assertEqual(60, len(crawler._adjacency_list))
+
+    def test_report(self):
+        with WikiServer(build_wiki(articles=60, links=5)) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            crawler = Crawler(server.base_url, report_dir=directory, top=10)
+            crawler.run()
+            crawler._report.write(directory, crawler._urls, image=True)
+            results = crawler.analyze()
+            in_degree = dict(zip(results['urls'], results['in_degree']))
+
+            with open(os.path.join(directory, 'report.json')) as f:
+                report = json.load(f)
+            self.assertEqual(60, report['pages'])
+            self.assertEqual(300, report['links'])
+            for key in ('in_degree_bins', 'out_degree_bins'):
+                self.assertEqual(60, sum(row['count'] for row in report[key]))
+            self.assertEqual(10, len(report['top']))
+            self.assertEqual(sorted(in_degree.values(), reverse=True)[:10],
+                             [count for _, count in report['top']])
+            for url, count in report['top']:
+                self.assertEqual(in_degree[url], count)
+            with open(os.path.join(directory, 'top.csv')) as f:
+                self.assertEqual(11, len(f.readlines()))
+            self.assertTrue(
+                os.path.exists(os.path.join(directory, 'degrees.png')))
+
+        # snapshots during the crawl are written by one background thread
+        with WikiServer(build_wiki(articles=60, links=5)) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            crawler = Crawler(server.base_url, report_dir=directory,
+                              report_every=7)
+            writer = crawler._report_writer
+            with mock.patch.object(writer, 'request',
+                                   wraps=writer.request) as request:
+                crawler.run()
+            self.assertEqual(8, request.call_count)
+            writer.stop()
+            self.assertIsNone(writer._thread)
+            # files are replaced whole, no temporary ones are left
+            self.assertLessEqual(set(os.listdir(directory)),
+                                 {'report.json', 'top.csv'})
+
+            written = writer.written
+            writer.request()
+            for _ in range(500):
+                if writer.written > written:
+                    break
+                time.sleep(0.01)
+            writer.stop()
+            self.assertEqual(written + 1, writer.written)
+            with open(os.path.join(directory, 'report.json')) as f:
+                self.assertEqual(60, json.load(f)['pages'])
+
+    def test_metrics(self):
+        histogram = Histogram(significant=2)
+        for value in range(1, 100001):
+            histogram.record(value)
+        self.assertEqual(100000, histogram.count)
+        for q in (50, 90, 99, 99.9):
+            self.assertAlmostEqual(q * 1000, histogram.percentile(q),
+                                   delta=q * 10)
+        self.assertEqual(100000, histogram.percentile(100))
+
+        failures = [f'/wiki/{article_title(i)}' for i in range(5)]
+        with WikiServer(build_wiki(articles=40, links=5), failures) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.jsonl')
+            crawler = Crawler(server.base_url, metrics_interval=0.05,
+                              metrics_path=path)
+            crawler.run()
+            with open(path) as f:
+                snapshots = [json.loads(line) for line in f]
+            last = snapshots[-1]
+            self.assertEqual(42, last['counters']['status_200'])
+            self.assertEqual(5, last['counters']['retries'])
+            self.assertEqual(40, last['counters']['articles'])
+            self.assertEqual(42, last['histograms']['fetch_latency']['count'])
+            self.assertEqual(42, last['histograms']['parse_latency']['count'])
+            self.assertEqual(0, last['gauges']['frontier'])
+            self.assertIn('articles', last['rates'])
+
+    def test_resume(self):
+        pages = build_wiki(articles=40, links=5, per_staff_page=10)
+        missing = {f'/wiki/{article_title(i)}' for i in range(0, 40, 3)}
+        available = {path: page for path, page in pages.items()
+                     if path not in missing}
+        engines = (
+            (Crawler, {}),
+            (AsyncCrawler, {'parsers': 1}),
+            (PipelineCrawler, {'fetchers': 4, 'parsers': 1}),
+        )
+        for engine, kwargs in engines:
+            with self.subTest(engine=engine.__name__), \
+                    WikiServer(available) as server, \
+                    tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'crawl.sqlite')
+                crawler = engine(server.base_url, state_path=path,
+                                 checkpoint_every=5, frontier_window=7,
+                                 **kwargs)
+                crawler.run()
+                self.assertEqual(40 - len(missing),
+                                 len(list(crawler._state.adjacency())))
+                self.assertEqual(len(missing), crawler._state.pending())
+                self.assertEqual(0, crawler._state.pending(True))
+                crawler.close()
+
+                server.pages = pages
+                server.requests.clear()
+                crawler = engine.resume(path, **kwargs)
+                # only crawled pages are visited, they are kept in the state
+                self.assertIsInstance(crawler.processed_pages,
+                                      StateVisitedSet)
+                self.assertEqual(40 - len(missing),
+                                 len(crawler.processed_pages))
+                crawler.run()
+                self.assertEqual(40, len(crawler.processed_pages))
+                self.assertEqual(sorted(missing), sorted(server.requests))
+                adjacency = {url: set(links) for url, links
+                             in crawler._adjacency_list.items()}
+                self.assertEqual(self._expected_adjacency(server, 40, 5),
+                                 adjacency)
+                crawler.close()
+
+    def test_http_cache(self):
+        pages = build_wiki(articles=40, links=5)
+        with WikiServer(pages) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.db')
+            with Crawler(server.base_url, cache_path=path) as crawler:
+                crawler.run()
+            fetched = len(server.requests)
+
+            changed = f'/wiki/{article_title(7)}'
+            removed = f'/wiki/{article_title(article_links(7, 40, 5)[0])}'
+            server.pages[changed] = pages[changed].replace(
+                f'"{removed}"', '"/wiki/Nowhere"')
+            with mock.patch('hw_3.crawler.parse_article',
+                            wraps=parse_article) as parse:
+                crawler = Crawler(server.base_url, cache_path=path)
+                crawler.run()
+            self.assertEqual(1, parse.call_count)
+
+            stats = crawler.cache_stats
+            self.assertEqual(fetched, len(server.requests) - fetched)
+            self.assertEqual(1, stats['misses'])
+            self.assertEqual(fetched - 1, stats['hits'])
+            self.assertGreater(stats['bytes_saved'], 0)
+            expected = self._expected_adjacency(server, 40, 5)
+            expected[server.root + changed].remove(server.root + removed)
+            adjacency = {url: set(links) for url, links
+                         in crawler._adjacency_list.items()}
+            self.assertEqual(expected, adjacency)
+            crawler.close()
+
+            # bodies of unchanged pages are kept as well
+            crawler = Crawler(server.base_url, cache_path=path,
+                              keep_bodies=True)
+            crawler.run()
+            self.assertEqual(fetched, crawler.cache_stats['hits'])
+            url = f'{server.root}/wiki/{article_title(3)}'
+            self.assertEqual(server.pages[f'/wiki/{article_title(3)}'],
+                             crawler._pages[url])
+            crawler.close()
+
+        # links of a redirected url are kept under its final url
+        with WikiServer(pages, redirects={'/wiki/Old': changed}) as server, \
+                tempfile.TemporaryDirectory() as directory:
+            cache = HTTPCache(os.path.join(directory, 'cache.db'))
+            session = requests.Session()
+            session.mount('http://', CachingAdapter(cache))
+            old = server.root + '/wiki/Old'
+            self.assertFalse(session.get(old).from_cache)
+            cache.store_links(old, ['a', 'b'])
+            self.assertEqual(['a', 'b'], cache.links(server.root + changed))
+            response = session.get(old)
+            self.assertTrue(response.from_cache)
+            self.assertEqual(pages[changed], response.text)
+            self.assertEqual(['a', 'b'], cache.links(old))
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+            session.close()
+            cache.close()
+
+    def test_throttle(self):
+        bucket = TokenBucket(rate=100, burst=5)
+        delays = [bucket.take() for _ in range(10)]
+        self.assertEqual([0.0] * 5, delays[:5])
+        self.assertAlmostEqual(0.05, delays[-1], delta=0.01)
+
+        concurrency = AdaptiveConcurrency(4, maximum=8, window=10)
+        for _ in range(30):
+            concurrency.acquire()
+            concurrency.release(0.01, 200)
+        self.assertEqual(7, concurrency.limit)
+        concurrency.acquire()
+        concurrency.release(0.01, 503)
+        self.assertEqual(3, concurrency.limit)
+        for _ in range(10):
+            concurrency.acquire()
+            concurrency.release(0.1, 200)
+        self.assertEqual(1, concurrency.limit)
+
+        failures = [f'/wiki/{article_title(i)}' for i in range(10)]
+        with WikiServer(build_wiki(articles=60, links=5), failures) as server:
+            crawler = Crawler(server.base_url, max_concurrency=16,
+                              rate_limit=500, burst=10)
+            crawler.run()
+            self.assertEqual(60, len(crawler._adjacency_list))
+            self.assertLessEqual(crawler.concurrency_limit, 16)
+
+            # without `max_concurrency` the limit may grow as well
+            crawler = Crawler(server.base_url, process_amount=2)
+            self.assertEqual(2, crawler.concurrency_limit)
+            self.assertEqual(64, crawler._concurrency.maximum)
+
+    def test_async_crawler(self):
+        pages = build_wiki(articles=300, links=8, per_staff_page=50)
+        failures = [f'/wiki/{article_title(3)}', f'/wiki/{article_title(4)}']
+        with WikiServer(pages, failures) as server:
+            crawler = AsyncCrawler(server.base_url, concurrency=200,
+                                   parsers=2)
+            # pages are parsed in worker processes, not on the loop
+            with mock.patch('hw_3.crawler.parse_article') as parse:
+                crawler.run()
+            parse.assert_not_called()
+            adjacency = {url: set(links) for url, links
+                         in crawler._adjacency_list.items()}
+            self.assertEqual(self._expected_adjacency(server, 300, 8),
+                             adjacency)
+            self.assertEqual(300, len(crawler.processed_pages))
+            self.assertEqual(2, server.requests.count(failures[0]))
+
+            # the blocking `crawl` of the base crawler still works
+            url = f'{server.root}/wiki/{article_title(7)}'
+            crawler = AsyncCrawler(server.base_url)
+            crawler.crawl(url)
+            self.assertEqual(self._expected_adjacency(server, 300, 8)[url],
+                             set(crawler._adjacency_list[url]))
+
+    def test_pipeline_crawler(self):
+        with WikiServer(build_wiki(articles=200, links=6)) as server:
+            crawler = PipelineCrawler(server.base_url, fetchers=8, parsers=2,
+                                      queue_size=10)
+            crawler.run()
+            adjacency = {url: set(links) for url, links
+                         in crawler._adjacency_list.items()}
+            self.assertEqual(self._expected_adjacency(server, 200, 6),
+                             adjacency)
+            depths = crawler.queue_depths()
+            self.assertEqual(0, depths['bodies'])
+            self.assertTrue(depths['max_bodies'] <= 10)
+            # `fetchers` bounds fetches in flight
+            self.assertEqual(8, crawler._concurrency.maximum)
+            self.assertEqual(8, crawler._pool._max_workers)
+
+            # an unexpected error of a fetcher doesn't stall the stage
+            failing = server.root + f'/wiki/{article_title(5)}'
+            crawler = PipelineCrawler(server.base_url, fetchers=8, parsers=2,
+                                      keep_bodies=True)
+            reuse_links = crawler.reuse_links
+
+            def fail_once(url, response, is_staff=False):
+                if url == failing:
+                    raise ValueError(url)
+                return reuse_links(url, response, is_staff)
+
+            crawler.reuse_links = fail_once
+            crawler.run()
+            adjacency = {url: set(links) for url, links
+                         in crawler._adjacency_list.items()}
+            self.assertFalse(adjacency.pop(failing, None))
+            expected = self._expected_adjacency(server, 200, 6)
+            del expected[failing]
+            self.assertEqual(expected, adjacency)
+            url = f'{server.root}/wiki/{article_title(3)}'
+            self.assertEqual(server.pages[f'/wiki/{article_title(3)}'],
+                             crawler._pages[url])
+            crawler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
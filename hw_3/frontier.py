@@ -0,0 +1,307 @@
+import heapq
+import itertools
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from queue import Empty
+from urllib.parse import urlsplit
+
+
+def fifo_priority(url: str) -> float:
+    """Every url gets the same priority, so urls go in FIFO order."""
+    return 0
+
+
+def depth_priority(url: str) -> float:
+    """Urls with fewer path segments go first."""
+    return urlsplit(url).path.rstrip('/').count('/')
+
+
+class InDegreePriority:
+    """Urls with more observed links to them go first. Priorities change
+    as links are observed, so queued urls should be re-scored with
+    `Frontier.update`."""
+
+    def __init__(self):
+        self._counts = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, links):
+        with self._lock:
+            for link in links:
+                self._counts[link] = self._counts.get(link, 0) + 1
+
+    def __call__(self, url: str) -> float:
+        return -self._counts.get(url, 0)
+
+
+class RecrawlAgePriority:
+    """Never crawled urls go first, then the least recently crawled;
+    `crawled` maps urls to times of their last crawl."""
+
+    def __init__(self, crawled):
+        self.crawled = crawled
+
+    def __call__(self, url: str) -> float:
+        return self.crawled.get(url, float('-inf'))
+
+
+class Frontier:
+    """
+    Queue-compatible crawl frontier with priorities and per-host fairness.
+
+    Every host has its own heap of (priority, order of put, url), lower
+    priority goes first; `get` takes the best url of hosts in turn.
+    At most `memory_limit` urls are kept in memory, when there are
+    more the worst half of them is spilled to an SQLite file and read
+    back in batches once they are the best of their host.
+
+    A url queued in memory is kept once with its best priority.
+    `update` re-scores queued urls: a new entry is pushed and the old
+    one is skipped when it comes up.
+    """
+
+    def __init__(self, priority=fifo_priority, memory_limit: int = 100000,
+                 spill_path: str = None, batch: int = 1000):
+        assert memory_limit > 1, '`memory_limit` should be greater than 1.'
+        self.priority = priority
+        self.memory_limit = memory_limit
+        self.batch = batch
+        self._heaps = dict()
+        self._hosts = deque()
+        # url -> (priority, order) of its live entry in memory, entries
+        # which don't match are stale
+        self._keys = dict()
+        self._stale = 0
+        self._spilled = 0
+        # host -> (priority, order) of its best spilled url
+        self._spill_best = dict()
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+        self.spill_path = spill_path
+        self._remove_spill = spill_path is None
+        # the spill file is created on the first spill
+        self._connection = None
+
+    def _connect(self):
+        if self.spill_path is None:
+            descriptor, self.spill_path = tempfile.mkstemp(suffix='.frontier')
+            os.close(descriptor)
+        self._connection = sqlite3.connect(self.spill_path,
+                                           check_same_thread=False)
+        self._connection.executescript('''
+            DROP TABLE IF EXISTS frontier;
+            CREATE TABLE frontier (
+                host TEXT NOT NULL,
+                priority REAL NOT NULL,
+                position INTEGER NOT NULL,
+                url TEXT NOT NULL
+            );
+            CREATE INDEX frontier_best ON frontier (host, priority, position);
+            CREATE INDEX frontier_url ON frontier (url);
+        ''')
+
+    @property
+    def spilled(self):
+        return self._spilled
+
+    def qsize(self):
+        return len(self._keys) + self._spilled
+
+    def empty(self):
+        return not self.qsize()
+
+    def put(self, url: str, block: bool = True, timeout: float = None,
+            priority: float = None):
+        """Adds the url, `priority` overrides the priority function."""
+        if priority is None:
+            priority = self.priority(url)
+        host = urlsplit(url).netloc
+        with self._condition:
+            self._push(host, url, priority)
+            if len(self._keys) > self.memory_limit:
+                self._spill()
+            self._condition.notify()
+
+    def put_nowait(self, url: str):
+        self.put(url, block=False)
+
+    def update(self, urls):
+        """Re-scores queued urls with the priority function."""
+        with self._condition:
+            spilled = []
+            for url in urls:
+                key = self._keys.get(url, None)
+                if key is not None:
+                    priority = self.priority(url)
+                    if priority != key[0]:
+                        self._push(urlsplit(url).netloc, url, priority, True)
+                elif self._spilled:
+                    spilled.append((self.priority(url), url))
+            if spilled:
+                self._update_spilled(spilled)
+            if self._stale > self.memory_limit:
+                self._compact()
+
+    def _push(self, host: str, url: str, priority: float,
+              replace: bool = False):
+        key = self._keys.get(url, None)
+        if key is not None:
+            if not replace and key[0] <= priority:
+                return
+            self._stale += 1
+        heap = self._heaps.get(host, None)
+        if heap is None:
+            heap = self._heaps[host] = []
+            if host not in self._spill_best:
+                self._hosts.append(host)
+        entry = (priority, next(self._order), url)
+        heapq.heappush(heap, entry)
+        self._keys[url] = entry[:2]
+
+    def get(self, block: bool = True, timeout: float = None) -> str:
+        with self._condition:
+            if not block:
+                timeout = 0
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.qsize():
+                remaining = None if deadline is None else \
+                    deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise Empty
+                self._condition.wait(remaining)
+            while True:
+                host = self._hosts[0]
+                self._hosts.rotate(-1)
+                url = self._pop(host)
+                if url is not None:
+                    return url
+
+    def get_nowait(self) -> str:
+        return self.get(block=False)
+
+    def _pop(self, host: str):
+        """Best url of the host, None if the host had only stale entries."""
+        while True:
+            heap = self._heaps.get(host, None)
+            best = self._spill_best.get(host, None)
+            if best is not None and (not heap or best < heap[0][:2]):
+                self._load(host)
+                continue
+            if not heap:
+                self._heaps.pop(host, None)
+                self._hosts.remove(host)
+                return None
+            priority, order, url = heapq.heappop(heap)
+            if self._keys.get(url, None) != (priority, order):
+                self._stale -= 1
+                continue
+            del self._keys[url]
+            if not heap:
+                del self._heaps[host]
+                if host not in self._spill_best:
+                    self._hosts.remove(host)
+            return url
+
+    def _compact(self):
+        """Drops stale entries from the heaps."""
+        heaps = dict()
+        for host, heap in self._heaps.items():
+            heap = [entry for entry in heap
+                    if self._keys.get(entry[2], None) == entry[:2]]
+            if heap:
+                heapq.heapify(heap)
+                heaps[host] = heap
+        self._heaps = heaps
+        self._stale = 0
+        self._drop_empty_hosts()
+
+    def _drop_empty_hosts(self):
+        """Hosts which had only stale entries aren't served anymore."""
+        self._hosts = deque(host for host in self._hosts
+                            if host in self._heaps or host in self._spill_best)
+
+    def _spill(self):
+        """Moves the worst half of urls in memory to the disk."""
+        entries = [(entry, host) for host, heap in self._heaps.items()
+                   for entry in heap
+                   if self._keys.get(entry[2], None) == entry[:2]]
+        entries.sort()
+        keep = self.memory_limit // 2
+        spilled = entries[keep:]
+        if self._connection is None:
+            self._connect()
+        self._connection.executemany(
+            'INSERT INTO frontier VALUES (?, ?, ?, ?)',
+            ((host, priority, order, url)
+             for (priority, order, url), host in spilled))
+        self._connection.commit()
+
+        heaps = dict()
+        for entry, host in entries[:keep]:
+            heaps.setdefault(host, []).append(entry)
+        for (priority, order, url), host in spilled:
+            del self._keys[url]
+            best = self._spill_best.get(host, None)
+            if best is None or (priority, order) < best:
+                self._spill_best[host] = (priority, order)
+        self._heaps = heaps
+        self._stale = 0
+        self._spilled += len(spilled)
+        self._drop_empty_hosts()
+
+    def _update_spilled(self, priorities):
+        """Re-scores spilled urls, [(priority, url)]."""
+        cursor = self._connection.executemany(
+            'UPDATE frontier SET priority = ? WHERE url = ?', priorities)
+        if not cursor.rowcount:
+            return
+        hosts = {urlsplit(url).netloc for _, url in priorities}
+        for host in hosts & self._spill_best.keys():
+            self._spill_best[host] = tuple(self._connection.execute(
+                'SELECT priority, position FROM frontier WHERE host = ? '
+                'ORDER BY priority, position LIMIT 1', (host,)).fetchone())
+        self._connection.commit()
+
+    def _load(self, host: str):
+        """Moves a batch of the best spilled urls of the host to memory."""
+        rows = self._connection.execute(
+            'SELECT rowid, priority, position, url FROM frontier '
+            'WHERE host = ? ORDER BY priority, position LIMIT ?',
+            (host, self.batch)).fetchall()
+        self._connection.executemany('DELETE FROM frontier WHERE rowid = ?',
+                                     ((row[0],) for row in rows))
+        self._connection.commit()
+        heap = self._heaps.setdefault(host, [])
+        for _, priority, order, url in rows:
+            key = self._keys.get(url, None)
+            if key is not None:
+                # the url has been queued again, the better entry stays
+                if key <= (priority, order):
+                    continue
+                self._stale += 1
+            heapq.heappush(heap, (priority, order, url))
+            self._keys[url] = (priority, order)
+        self._spilled -= len(rows)
+
+        best = self._connection.execute(
+            'SELECT priority, position FROM frontier WHERE host = ? '
+            'ORDER BY priority, position LIMIT 1', (host,)).fetchone()
+        if best is None:
+            del self._spill_best[host]
+        else:
+            self._spill_best[host] = tuple(best)
+
+    def close(self):
+        with self._condition:
+            if self._connection is None:
+                return
+            self._connection.close()
+            self._connection = None
+            if self._remove_spill:
+                os.remove(self.spill_path)
+                self.spill_path = None
@@ -0,0 +1,194 @@
+import threading
+from array import array
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+class URLIndex:
+    """Interns urls: every url is stored once and gets an integer id."""
+
+    def __init__(self):
+        self._ids = dict()
+        self._urls = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def __iter__(self):
+        return iter(self._urls)
+
+    def intern(self, url: str) -> int:
+        """Returns id of the url, new urls get the next id."""
+        url_id = self._ids.get(url, None)
+        if url_id is None:
+            with self._lock:
+                url_id = self._ids.get(url, None)
+                if url_id is None:
+                    url_id = len(self._urls)
+                    self._urls.append(url)
+                    self._ids[url] = url_id
+        return url_id
+
+    def canonical(self, url: str) -> str:
+        """Returns the interned copy of the url."""
+        return self._urls[self.intern(url)]
+
+    def id(self, url: str, default=None):
+        return self._ids.get(url, default)
+
+    def url(self, url_id: int) -> str:
+        return self._urls[url_id]
+
+
+class LinkGraph(MutableMapping):
+    """
+    Link graph over interned urls which behaves like a
+    {url: [linked urls]} mapping of pages with known links.
+
+    Links set since the last `freeze` are kept as `array('i')` rows,
+    `freeze` merges them into CSR `int32` arrays: links of the page
+    with id `i` are `indices[indptr[i]:indptr[i + 1]]`.
+    """
+
+    def __init__(self, urls: URLIndex = None):
+        self.urls = urls if urls is not None else URLIndex()
+        self._indptr = np.zeros(1, dtype=np.int32)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._pending = dict()
+        # 1 for ids of pages which have a row of links
+        self._rows = bytearray()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def indptr(self):
+        self.freeze()
+        return self._indptr
+
+    @property
+    def indices(self):
+        self.freeze()
+        return self._indices
+
+    @property
+    def node_count(self):
+        return len(self.urls)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, url):
+        url_id = self.urls.id(url)
+        return url_id is not None and url_id < len(self._rows) \
+            and bool(self._rows[url_id])
+
+    def __iter__(self):
+        for url_id, has_row in enumerate(self._rows):
+            if has_row:
+                yield self.urls.url(url_id)
+
+    def __getitem__(self, url):
+        if url not in self:
+            raise KeyError(url)
+        return [self.urls.url(i) for i in self.row(self.urls.id(url))]
+
+    def __setitem__(self, url, links):
+        source = self.urls.intern(url)
+        row = array('i', (self.urls.intern(link) for link in links))
+        with self._lock:
+            self._pending[source] = row
+            self._mark(source)
+
+    def __delitem__(self, url):
+        if url not in self:
+            raise KeyError(url)
+        url_id = self.urls.id(url)
+        with self._lock:
+            self._pending[url_id] = array('i')
+            self._rows[url_id] = 0
+            self._size -= 1
+
+    def row(self, url_id: int):
+        """Ids of pages the page links to."""
+        row = self._pending.get(url_id, None)
+        if row is not None:
+            return row
+        if url_id + 1 < len(self._indptr):
+            return self._indices[self._indptr[url_id]:self._indptr[url_id + 1]]
+        return self._indices[:0]
+
+    def freeze(self):
+        """Merges pending rows into the CSR arrays."""
+        with self._lock:
+            if not self._pending and len(self._indptr) == self.node_count + 1:
+                return
+            nodes = self.node_count
+            old_sources = np.repeat(
+                np.arange(len(self._indptr) - 1, dtype=np.int32),
+                np.diff(self._indptr))
+            pending_ids = np.fromiter(self._pending.keys(), dtype=np.int32,
+                                      count=len(self._pending))
+            replaced = np.zeros(nodes, dtype=bool)
+            replaced[pending_ids] = True
+            kept = ~replaced[old_sources]
+
+            rows = list(self._pending.values())
+            sources = np.concatenate([
+                old_sources[kept],
+                np.repeat(pending_ids, [len(row) for row in rows])])
+            targets = np.concatenate(
+                [self._indices[kept]] +
+                [np.frombuffer(row, dtype=np.int32) for row in rows if row])
+
+            order = np.argsort(sources, kind='stable')
+            self._indices = targets[order].astype(np.int32)
+            self._indptr = np.zeros(nodes + 1, dtype=np.int32)
+            np.cumsum(np.bincount(sources, minlength=nodes),
+                      out=self._indptr[1:])
+            self._pending = dict()
+
+    def restrict(self, nodes: np.ndarray):
+        """
+        Keeps only links between the `nodes` (a bool mask over url ids),
+        every one of them gets a row even if its links are unknown.
+        """
+        self.freeze()
+        with self._lock:
+            sources = np.repeat(np.arange(self.node_count, dtype=np.int32),
+                                np.diff(self._indptr))
+            kept = nodes[sources] & nodes[self._indices]
+            counts = np.bincount(sources[kept], minlength=self.node_count)
+            indptr = np.zeros(self.node_count + 1, dtype=np.int32)
+            np.cumsum(counts, out=indptr[1:])
+            self._indptr = indptr
+            self._indices = self._indices[kept]
+
+            self._rows = bytearray(nodes.astype(np.uint8).tobytes())
+            self._size = int(nodes.sum())
+
+    def nodes(self):
+        """Bool mask of url ids which have a row of links."""
+        mask = np.zeros(self.node_count, dtype=bool)
+        mask[:len(self._rows)] = np.frombuffer(bytes(self._rows),
+                                               dtype=np.uint8).astype(bool)
+        return mask
+
+    def in_degree(self):
+        """Amount of links to every url id."""
+        return np.bincount(self.indices, minlength=self.node_count)
+
+    def out_degree(self):
+        """Amount of links from every url id."""
+        return np.diff(self.indptr)
+
+    def _mark(self, url_id: int):
+        if url_id >= len(self._rows):
+            self._rows.extend(bytes(url_id + 1 - len(self._rows)))
+        if not self._rows[url_id]:
+            self._rows[url_id] = 1
+            self._size += 1
@@ -0,0 +1,190 @@
+import json
+import sqlite3
+import threading
+import zlib
+from urllib.parse import urljoin
+
+from requests.adapters import HTTPAdapter
+
+# hops of redirects followed to the cached url
+MAX_REDIRECTS = 10
+
+
+class HTTPCache:
+    """
+    SQLite-backed cache of fetched pages for conditional GETs.
+
+    Bodies are kept zlib-compressed with their `ETag` and
+    `Last-Modified` validators and, optionally, links parsed from
+    them, so an unchanged page costs neither the download nor
+    the parsing on recrawl. Links are kept under the final url of
+    redirects, the requested url is resolved through `redirects`.
+    """
+
+    def __init__(self, path: str, level: int = 6):
+        self.path = path
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                encoding TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                links TEXT
+            );
+            CREATE TABLE IF NOT EXISTS redirects (
+                url TEXT PRIMARY KEY,
+                target TEXT NOT NULL
+            );
+        ''')
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    def validators(self, url: str) -> dict:
+        """Conditional request headers for the cached url."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT etag, last_modified FROM responses WHERE url = ?',
+                (url,)).fetchone()
+        headers = dict()
+        if row and row[0]:
+            headers['If-None-Match'] = row[0]
+        if row and row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def load(self, url: str):
+        """Returns (body bytes, encoding) of the cached url or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT body, encoding FROM responses WHERE url = ?',
+                (url,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0]), row[1]
+
+    def store_redirect(self, url: str, target: str):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO redirects VALUES (?, ?)',
+                (url, target))
+            self._connection.commit()
+
+    def resolve(self, url: str) -> str:
+        """The url the cached redirects of the url lead to."""
+        with self._lock:
+            for _ in range(MAX_REDIRECTS):
+                row = self._connection.execute(
+                    'SELECT target FROM redirects WHERE url = ?',
+                    (url,)).fetchone()
+                if row is None:
+                    break
+                url = row[0]
+        return url
+
+    def store(self, url: str, body: bytes, etag: str = None,
+              last_modified: str = None, encoding: str = None):
+        with self._lock:
+            # the url doesn't redirect anymore
+            self._connection.execute('DELETE FROM redirects WHERE url = ?',
+                                     (url,))
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(url, etag, last_modified, encoding, body, size) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, encoding,
+                 zlib.compress(body, self.level), len(body)))
+            self._connection.commit()
+
+    def links(self, url: str):
+        """Links parsed from the cached body or None."""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT links FROM responses WHERE url = ?',
+                (self.resolve(url),)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def store_links(self, url: str, links):
+        with self._lock:
+            self._connection.execute(
+                'UPDATE responses SET links = ? WHERE url = ?',
+                (json.dumps(sorted(links)), self.resolve(url)))
+            self._connection.commit()
+
+    def hit(self, size: int):
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += size
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """
+    HTTP adapter which revalidates cached GETs: `304 Not Modified` is
+    answered with the cached body as `200` and `from_cache` flag set.
+    Redirects are remembered and not counted as hits or misses, only
+    the final hop is.
+    """
+
+    def __init__(self, cache: HTTPCache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+        request.headers.update(self.cache.validators(request.url))
+        response = super().send(request, **kwargs)
+        response.from_cache = False
+
+        if response.is_redirect:
+            self.cache.store_redirect(
+                request.url, urljoin(request.url, response.headers['location']))
+            return response
+
+        if response.status_code == 304:
+            cached = self.cache.load(request.url)
+            if cached is not None:
+                body, encoding = cached
+                self.cache.hit(len(body))
+                response.status_code = 200
+                response.reason = 'OK'
+                response._content = body
+                response.encoding = encoding
+                response.from_cache = True
+                return response
+
+        self.cache.miss()
+        etag = response.headers.get('ETag', None)
+        last_modified = response.headers.get('Last-Modified', None)
+        if response.status_code == 200 and (etag or last_modified):
+            self.cache.store(request.url, response.content, etag,
+                             last_modified, response.encoding)
+        return response
@@ -0,0 +1,165 @@
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+# text of the namespace tab of articles
+ARTICLE_KIND = 'Артыкул'
+
+
+class StrangeException(Exception):
+    """Exception is raised when Crawler expects staff page
+    but get page of another type."""
+    pass
+
+
+def parse_staff_page(text: str, base_url: str):
+    """
+    Find article urls and next staff urls in the staff page.
+    Returns None if the page has no main content.
+    """
+    soup = BeautifulSoup(text, 'html.parser')
+    main_content = soup.find("div", {"id": "content"})
+    if not main_content:
+        return None
+    all_pages = main_content.find("div", {"class": "mw-allpages-body"})
+    if not all_pages:
+        raise StrangeException('Strange staff page without all_pages.')
+
+    articles = []
+    for link in all_pages.find_all('a', href=True):
+        url = link['href']
+        # check that link is to the current site
+        if url.startswith('/wiki') or url.startswith(base_url):
+            articles.append(urljoin(base_url, url))
+
+    staff_pages = []
+    navigation = main_content.find("div", {"class": "mw-allpages-nav"})
+    if navigation:
+        for link in navigation.find_all("a", recursive=False):
+            staff_pages.append(urljoin(base_url, link['href']))
+    return articles, staff_pages
+
+
+class ArticleLinkParser(HTMLParser):
+    """
+    Event-driven link extractor which doesn't build a document tree.
+
+    Only `div` tags are tracked: links are collected while the parser
+    is inside the first `div#content` and outside of `div#catlinks`.
+    `kind` is the text of the namespace tab (`li#ca-nstab-main`).
+    """
+
+    def __init__(self, base_url: str):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links = set()
+        self._depth = 0
+        self._content_depth = None
+        self._skip_depth = None
+        self._content_seen = False
+        self.kind = ''
+        self._in_tab = False
+        self._in_kind = False
+
+    @property
+    def content_seen(self):
+        return self._content_seen
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            self._depth += 1
+            div_id = dict(attrs).get('id', None)
+            if self._content_depth is None:
+                if div_id == 'content' and not self._content_seen:
+                    self._content_depth = self._depth
+                    self._content_seen = True
+            elif div_id == 'catlinks' and self._skip_depth is None:
+                self._skip_depth = self._depth
+        elif tag == 'li' and ('id', 'ca-nstab-main') in attrs:
+            self._in_tab = True
+        elif tag == 'a' and self._in_tab:
+            self._in_kind = True
+        elif tag == 'a' and self._content_depth is not None \
+                and self._skip_depth is None:
+            for name, value in attrs:
+                if name == 'href' and value is not None:
+                    if 'wiki' in value:
+                        self.links.add(urljoin(self.base_url, value))
+                    break
+
+    def handle_startendtag(self, tag, attrs):
+        # `<div/>` doesn't open a block, `<a/>` may still be a link
+        if tag != 'div':
+            self.handle_starttag(tag, attrs)
+
+    def handle_data(self, data):
+        if self._in_kind:
+            self.kind += data
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._in_kind = False
+        elif tag == 'li':
+            self._in_tab = False
+        if tag != 'div' or not self._depth:
+            return
+        if self._skip_depth == self._depth:
+            self._skip_depth = None
+        if self._content_depth == self._depth:
+            self._content_depth = None
+        self._depth -= 1
+
+
+def parse_article(text: str, base_url: str):
+    """
+    Find article links in the main content of the article,
+    links in the categories footer are skipped.
+    """
+    parser = ArticleLinkParser(base_url)
+    parser.feed(text)
+    parser.close()
+    return parser.links
+
+
+def parse_wiki_page(text: str, base_url: str):
+    """
+    Returns (whether the page is an article, links of its main content).
+    """
+    parser = ArticleLinkParser(base_url)
+    parser.feed(text)
+    parser.close()
+    return parser.kind.strip() == ARTICLE_KIND, parser.links
+
+
+def parse_article_soup(text: str, base_url: str):
+    """
+    The same as `parse_article` but on a complete BeautifulSoup tree.
+    """
+    soup = BeautifulSoup(text, 'html.parser')
+    main_content = soup.find("div", {"id": "content"})
+    if not main_content:
+        return set()
+
+    # remove links that don't have straight connection to the article
+    footer_links = main_content.find_all('div', {'id': 'catlinks'})
+    for link in footer_links:
+        link.extract()
+
+    adj_list = set()
+    for link in main_content.find_all('a', href=True):
+        url = link['href']
+        if 'wiki' in url:
+            adj_list.add(urljoin(base_url, url))
+    return adj_list
+
+
+def parse_page(text: str, base_url: str, is_staff: bool = False):
+    """
+    Parses the page in a worker process, only lists of url strings
+    are sent back: (articles, staff pages) of a staff page or links
+    of an article.
+    """
+    if is_staff:
+        return parse_staff_page(text, base_url)
+    return sorted(parse_article(text, base_url))
@@ -0,0 +1,184 @@
+import json
+import sys
+import threading
+import time
+
+
+class Histogram:
+    """
+    HDR-style histogram of non-negative integers: values below
+    `2 ** sub_bits` are counted exactly, bigger ones in log-linear
+    buckets, `significant` decimal digits are kept for every value.
+    """
+
+    def __init__(self, significant: int = 2):
+        assert 1 <= significant <= 5, '`significant` should be in [1, 5].'
+        self.sub_bits = (2 * 10 ** significant - 1).bit_length()
+        self._sub_count = 1 << self.sub_bits
+        self._half = self._sub_count >> 1
+        self._counts = [0] * self._sub_count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def _index(self, value: int) -> int:
+        if value < self._sub_count:
+            return value
+        shift = value.bit_length() - self.sub_bits
+        return self._sub_count + (shift - 1) * self._half + \
+            (value >> shift) - self._half
+
+    def _value(self, index: int) -> int:
+        """The highest value counted in the bucket."""
+        if index < self._sub_count:
+            return index
+        shift = (index - self._sub_count) // self._half + 1
+        sub = (index - self._sub_count) % self._half + self._half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value: int, count: int = 1):
+        value = max(0, int(value))
+        index = self._index(value)
+        with self._lock:
+            if index >= len(self._counts):
+                self._counts.extend([0] * (index + 1 - len(self._counts)))
+            self._counts[index] += count
+            self.count += count
+            self.total += value * count
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> int:
+        """Value which `q` percent of recorded values don't exceed."""
+        with self._lock:
+            if not self.count:
+                return 0
+            rank = max(1, int(round(q / 100 * self.count)))
+            seen = 0
+            for index, count in enumerate(self._counts):
+                seen += count
+                if seen >= rank:
+                    return min(self._value(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'min': self.min or 0,
+            'max': self.max or 0,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p99.9': self.percentile(99.9),
+        }
+
+
+class Metrics:
+    """
+    Registry of counters, histograms and gauges of a crawl.
+    Gauges are functions which are called on `snapshot`.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._counters = dict()
+        self._histograms = dict()
+        self._gauges = dict()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> int:
+        return self._counters.get(name, 0)
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name, None)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def record(self, name: str, value: int):
+        self.histogram(name).record(value)
+
+    def record_time(self, name: str, seconds: float):
+        """Records the duration in microseconds."""
+        self.histogram(name).record(seconds * 1000000)
+
+    def gauge(self, name: str, function):
+        self._gauges[name] = function
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        return {
+            'elapsed': time.monotonic() - self.started,
+            'counters': counters,
+            'gauges': {name: function()
+                       for name, function in self._gauges.items()},
+            'histograms': {name: histogram.snapshot()
+                           for name, histogram in histograms.items()},
+        }
+
+
+class MetricsExporter:
+    """
+    Writes a JSON line with a snapshot of metrics and rates of counters
+    since the previous one every `interval` seconds to the file at
+    `path` (appending) or to stdout.
+    """
+
+    def __init__(self, metrics: Metrics, interval: float = 10.0,
+                 path: str = None):
+        assert interval > 0, '`interval` should be positive.'
+        self.metrics = metrics
+        self.interval = interval
+        self.path = path
+        self._previous = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self) -> dict:
+        snapshot = self.metrics.snapshot()
+        previous = self._previous or {'elapsed': 0.0, 'counters': {}}
+        elapsed = snapshot['elapsed'] - previous['elapsed']
+        snapshot['rates'] = {
+            name: (value - previous['counters'].get(name, 0)) / elapsed
+            for name, value in snapshot['counters'].items()
+        } if elapsed > 0 else {}
+        self._previous = snapshot
+        line = json.dumps(snapshot, sort_keys=True)
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+        else:
+            print(line, file=sys.stdout)
+        return snapshot
+
+    def _export_forever(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._export_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the thread and exports the last snapshot."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.export()
@@ -0,0 +1,171 @@
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import zlib
+from array import array
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from hw_3.graph import URLIndex
+
+
+class PageStore(MutableMapping):
+    """
+    Bodies of pages keyed by url and indexed by url id of `URLIndex`.
+
+    Bodies are zlib-compressed and appended to blob files of up to
+    `blob_size` bytes in `path` (a temporary directory by default,
+    made on the first body). Reading a url decompresses its body,
+    `raw` gives the compressed bytes as a `memoryview` over `mmap`
+    without copying. A url stored with an empty body is known but
+    takes no space on disk, `''` is read back. Blobs already in `path`
+    aren't overwritten, new ones are numbered after them.
+    """
+
+    def __init__(self, urls: URLIndex = None, path: str = None,
+                 blob_size: int = 256 * 1024 * 1024, level: int = 6):
+        assert blob_size > 0, '`blob_size` should be positive.'
+        self.urls = urls if urls is not None else URLIndex()
+        self.path = path
+        self.blob_size = blob_size
+        self.level = level
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self._remove_path = path is None
+        # blob, offset and length of the body per url id, blob -1
+        # for urls which aren't in the store
+        self._blobs = array('i')
+        self._offsets = array('q')
+        self._lengths = array('i')
+        self._size = 0
+        self._active = 0
+        self._active_size = 0
+        self._file = None
+        self._maps = dict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, url):
+        url_id = self.urls.id(url)
+        return url_id is not None and url_id < len(self._blobs) \
+            and self._blobs[url_id] >= 0
+
+    def __iter__(self):
+        for url_id in self.ids():
+            yield self.urls.url(int(url_id))
+
+    def __getitem__(self, url) -> str:
+        return self.body(url).decode('utf-8')
+
+    def __setitem__(self, url, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        url_id = self.urls.intern(url)
+        with self._lock:
+            self._reserve(url_id)
+            if self._blobs[url_id] < 0:
+                self._size += 1
+            if not body:
+                self._blobs[url_id] = 0
+                self._offsets[url_id] = 0
+                self._lengths[url_id] = 0
+                return
+            data = zlib.compress(body, self.level)
+            blob, offset = self._append(data)
+            self._blobs[url_id] = blob
+            self._offsets[url_id] = offset
+            self._lengths[url_id] = len(data)
+            self.raw_bytes += len(body)
+            self.stored_bytes += len(data)
+
+    def __delitem__(self, url):
+        if url not in self:
+            raise KeyError(url)
+        with self._lock:
+            self._blobs[self.urls.id(url)] = -1
+            self._size -= 1
+
+    def raw(self, url) -> memoryview:
+        """Compressed body of the url, empty for urls without a body."""
+        if url not in self:
+            raise KeyError(url)
+        url_id = self.urls.id(url)
+        with self._lock:
+            offset, length = self._offsets[url_id], self._lengths[url_id]
+            if not length:
+                return memoryview(b'')
+            view = self._map(self._blobs[url_id], offset + length)
+        return memoryview(view)[offset:offset + length]
+
+    def body(self, url) -> bytes:
+        """Decompressed body of the url."""
+        raw = self.raw(url)
+        return zlib.decompress(raw) if len(raw) else b''
+
+    def ids(self) -> np.ndarray:
+        """Url ids of stored urls."""
+        with self._lock:
+            blobs = np.frombuffer(self._blobs, dtype=np.int32) \
+                if len(self._blobs) else np.zeros(0, dtype=np.int32)
+            return np.flatnonzero(blobs >= 0)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            # views given by `raw` keep their mappings alive
+            self._maps.clear()
+            if self._remove_path and self.path is not None:
+                shutil.rmtree(self.path, ignore_errors=True)
+                self.path = None
+
+    def _reserve(self, url_id: int):
+        missing = url_id + 1 - len(self._blobs)
+        if missing > 0:
+            self._blobs.extend(array('i', [-1]) * missing)
+            self._offsets.extend(array('q', [0]) * missing)
+            self._lengths.extend(array('i', [0]) * missing)
+
+    def _blob_path(self, blob: int):
+        return os.path.join(self.path, f'{blob:08d}.blob')
+
+    def _last_blob(self) -> int:
+        """Number of the last blob file in the path, 0 if there is none."""
+        blobs = [name[:-len('.blob')] for name in os.listdir(self.path)
+                 if name.endswith('.blob')]
+        return max((int(blob) for blob in blobs if blob.isdigit()), default=0)
+
+    def _append(self, data: bytes):
+        if self._file is None or self._active_size >= self.blob_size:
+            if self._file is None and self.path is None:
+                self.path = tempfile.mkdtemp(suffix='.pages')
+            if self._file is not None:
+                self._file.close()
+            os.makedirs(self.path, exist_ok=True)
+            if not self._active:
+                # blobs of a previous store in the path are kept
+                self._active = self._last_blob()
+            self._active += 1
+            self._active_size = 0
+            self._file = open(self._blob_path(self._active), 'wb')
+        offset = self._active_size
+        self._file.write(data)
+        self._file.flush()
+        self._active_size += len(data)
+        return self._active, offset
+
+    def _map(self, blob: int, end: int):
+        """Returns the mapping of the blob covering `end` bytes."""
+        view = self._maps.get(blob, None)
+        if view is None or len(view) < end:
+            # the old mapping is closed once no view given by `raw` uses it
+            with open(self._blob_path(blob), 'rb') as file:
+                view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[blob] = view
+        return view
@@ -1,105 +1,139 @@
-import csv
-import sys
-from concurrent.futures import ThreadPoolExecutor
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint
 from queue import Queue, Empty
-from urllib.parse import urljoin
-
-from bs4 import BeautifulSoup
 
 from hw_3.crawler import Crawler
+from hw_3.links import parse_wiki_page
+from hw_3.visited import ExactVisitedSet
 
 
-class StrangeException(Exception):
-    pass
+def parse_chunk(items, base_url: str):
+    """
+    Parses [(url, body)] in a worker process, returns
+    [(url, whether it is an article, sorted links)]. Bodies are str
+    or zlib-compressed utf-8 bytes.
+    """
+    results = []
+    for url, body in items:
+        if isinstance(body, bytes):
+            body = zlib.decompress(body).decode('utf-8')
+        is_article, links = parse_wiki_page(body, base_url)
+        results.append((url, is_article, sorted(links)))
+    return results
 
 
 class WikiParser:
-    def __init__(self, base_url: str, process_amount: int = 20):
+    """
+    Parse stage over bodies of crawled pages: `pages` maps urls to
+    bodies, e.g. `Crawler._pages` of a crawler with `keep_bodies`.
+    Bodies of a `PageStore` are sent to workers still compressed.
+
+    Pages are parsed in `process_amount` worker processes by chunks
+    of `chunk_size` pages. Only links between articles are kept, a page
+    which turns out not to be an article is removed with the reverse
+    index of links in O(its in-degree).
+    """
+
+    def __init__(self, base_url: str, process_amount: int = None,
+                 visited=ExactVisitedSet, chunk_size: int = 64):
         self.base_url = base_url
-        self.processed_pages = []
+        self.process_amount = process_amount or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        assert self.process_amount > 0, '`process_amount` should be positive.'
+        assert chunk_size > 0, '`chunk_size` should be positive.'
+        self.processed_pages = visited()
         self.unprocessed_pages = Queue()
-        self.adjacency_list = []
+        self.adjacency_list = dict()
         self.pages = dict()
-
-        self.pool = ThreadPoolExecutor(max_workers=process_amount)
-        self.works = []
-
-        # for page in self._adjacency_list:
-        #     adj_l = self._adjacency_list[page]
-        #     for link in adj_l:
-        #         if link not in self._adjacency_list.keys():
-        #             adj_l.remove(link)
-        #     self._adjacency_list[page] = adj_l
+        # url -> parsed articles which link to it
+        self._reverse = dict()
+        self._removed = set()
 
     def run(self):
         print(f'Len of unprocessed_pages: {self.unprocessed_pages.qsize()}.')
         self.run_articles()
 
     def run_articles(self):
+        if self.process_amount == 1:
+            for chunk in self._chunks():
+                self._store_chunk(parse_chunk(chunk, self.base_url))
+        else:
+            with ProcessPoolExecutor(self.process_amount) as pool:
+                # a window of chunks in flight keeps bodies out of memory
+                futures = deque()
+                for chunk in self._chunks():
+                    futures.append(pool.submit(parse_chunk, chunk,
+                                               self.base_url))
+                    if len(futures) >= 2 * self.process_amount:
+                        self._store_chunk(futures.popleft().result())
+                while futures:
+                    self._store_chunk(futures.popleft().result())
+        print(f'Have processed {len(self.processed_pages)} articles.')
+        print(f'Link arrays amount: {len(self.adjacency_list)}')
+        print(f'Removed {len(self._removed)} non-article pages.')
+
+    def _chunks(self):
+        raw = getattr(self.pages, 'raw', None)
+        chunk = []
         while True:
             try:
-                url = self.unprocessed_pages.get(timeout=2)
-
-                if url not in self.processed_pages:
-                    # print(f'Article {url}.')
-                    self.processed_pages.append(url)
-                    self.works.append(self.pool.submit(
-                        self.find_links, url))
+                url = self.unprocessed_pages.get_nowait()
             except Empty:
                 break
-            except KeyboardInterrupt:
-                print("Someone closed the program2")
-                break
-            except Exception as e:
-                print(f'Get Exception2: {e}')
-        print(f'Have processed {len(self.processed_pages)} articles.')
-        print(f'Link arrays amount: {len(self.adjacency_list)}')
+            if not self.processed_pages.add(url):
+                continue
+            if raw is not None:
+                body = bytes(raw(url)) if url in self.pages else None
+            else:
+                body = self.pages.get(url, None)
+            if not body:
+                continue
+            chunk.append((url, body))
+            if len(chunk) == self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
 
-    def find_links(self, current_url):
-        link_list = []
-        page = self.pages[current_url]
-        soup = BeautifulSoup(page, 'html.parser')
-        article = soup.find('li', {'id': 'ca-nstab-main'}).find('a').text == 'Артыкул'.encode("utf-8")
+    def _store_chunk(self, results):
+        for url, is_article, links in results:
+            if is_article:
+                self.store_links(url, links)
+            else:
+                self.remove_page(url)
 
-        if not article:
-            print(f'Can\'t find `Артыкул` in page.')
-            counter = 0
-            for some_page in self.adjacency_list:
-                if current_url in self.adjacency_list[some_page]:
-                    links = self.adjacency_list[some_page]
-                    links.pop(current_url)
-                    self.adjacency_list[some_page] = links
-                    counter += 1
-            print(f'Remove incorrect links from {counter} pages')
-            return link_list
-        main_content = soup.find("div", {"id": "content"})
-        adj_list = set()
-        footer_links = main_content.find_all('div', {'id': 'catlinks'})
-        for link in footer_links:
-            link.extract()
-        links = main_content.find_all('a', href=True)
+    def store_links(self, current_url: str, links):
+        """Keeps links of the article to known pages."""
+        links = {link for link in links
+                 if link in self.pages and link not in self._removed}
+        self.adjacency_list[current_url] = links
         for link in links:
-            url = link['href']
-            url = urljoin(self.base_url, url)
-            if self.pages.get(url, None):
-                adj_list.add(url)
-            # if url.startswith('/wiki') or url.startswith(self.base_url):
-                # if 'class' in link and \
-                #         all(cl not in self.skip_classes for cl in link['class']):
-                # url = urljoin(self.base_url, url)
-        self.adjacency_list[current_url] = adj_list
-        print(f'{len(adj_list)} links at {current_url}')
+            self._reverse.setdefault(link, set()).add(current_url)
+
+    def remove_page(self, url: str):
+        """Removes the non-article page and links to it,
+        returns the amount of changed pages."""
+        self._removed.add(url)
+        for link in self.adjacency_list.pop(url, ()):
+            self._reverse[link].discard(url)
+        sources = self._reverse.pop(url, ())
+        for source in sources:
+            self.adjacency_list[source].discard(url)
+        return len(sources)
 
 
 if __name__ == '__main__':
     # Усе артыкулы
-    crawler = Crawler(
-        'https://be.wikipedia.org/w/index.php?title=%D0%90%D0%B4%D0%BC%D1%8B%D1%81%D0%BB%D0%BE%D0%B2%D0%B0%D0%B5:AllPages&from=%21')
-    crawler.run()
-    parser = WikiParser(base_url='https://be.wikipedia.org/wiki/')
-    parser.unprocessed_pages = crawler.unprocessed_pages
-    parser.pages = crawler._pages
-    parser.run()
-    # pprint(crawler.processed_pages)
-    pprint(parser.adjacency_list)
\ No newline at end of file
+    with Crawler(
+            'https://be.wikipedia.org/w/index.php?title=%D0%90%D0%B4%D0%BC%D1%8B%D1%81%D0%BB%D0%BE%D0%B2%D0%B0%D0%B5:AllPages&from=%21',
+            keep_bodies=True) as crawler:
+        crawler.run()
+        parser = WikiParser(base_url='https://be.wikipedia.org/wiki/')
+        parser.pages = crawler._pages
+        for page in crawler._pages:
+            parser.unprocessed_pages.put(page)
+        parser.run()
+    pprint(parser.adjacency_list)
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue, Empty
+
+import requests
+
+from hw_3.crawler import Crawler
+from hw_3.frontier import fifo_priority
+from hw_3.links import parse_page
+from hw_3.visited import ExactVisitedSet, VisitedSet
+
+
+class PipelineCrawler(Crawler):
+    """
+    Crawler which fetches and parses pages in separate stages.
+
+    Up to `fetchers` threads (`max_concurrency`, if it is given)
+    download pages and put raw bodies into a bounded queue, `parsers`
+    worker processes parse them and send back only lists of found
+    urls, so parsing doesn't hold the GIL of the fetching threads.
+    Other keyword arguments (a state, a report, metrics...) are the
+    ones of `Crawler`.
+    """
+
+    def __init__(self, base_url: str,
+                 fetchers: int = 4,
+                 parsers: int = None,
+                 queue_size: int = 1000,
+                 timeout: int = 10,
+                 total_retry_count: int = 3,
+                 backoff_factor: float = 0.5,
+                 visited=ExactVisitedSet,
+                 cache_path: str = None,
+                 max_concurrency: int = None,
+                 rate_limit: float = None,
+                 burst: int = 1,
+                 priority=fifo_priority,
+                 **kwargs):
+        parsers = parsers or os.cpu_count() or 1
+        assert parsers > 0, '`parsers` should be positive.'
+        assert queue_size > 0, '`queue_size` should be positive.'
+        super().__init__(base_url, process_amount=fetchers, timeout=timeout,
+                         total_retry_count=total_retry_count,
+                         backoff_factor=backoff_factor, visited=visited,
+                         cache_path=cache_path,
+                         max_concurrency=max_concurrency or fetchers,
+                         rate_limit=rate_limit, burst=burst,
+                         priority=priority, **kwargs)
+        self.fetchers = fetchers
+        self.parsers = parsers
+
+        self._bodies = Queue(maxsize=queue_size)
+        self._parse_slots = threading.BoundedSemaphore(parsers * 2)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # urls taken from the frontier whose links aren't stored yet
+        self._pending = 0
+        self._fetching = 0
+        self._parsing = 0
+        self._max_bodies = 0
+        for name in ('fetching', 'bodies', 'parsing'):
+            self.metrics.gauge(name, lambda name=name: self.queue_depths()[name])
+
+    def queue_depths(self):
+        """Snapshot of every stage of the pipeline."""
+        return {
+            'staff_frontier': self._unprocessed_staff_pages.qsize(),
+            'frontier': self._unprocessed_pages.qsize(),
+            'fetching': self._fetching,
+            'bodies': self._bodies.qsize(),
+            'max_bodies': self._max_bodies,
+            'parsing': self._parsing,
+        }
+
+    def run(self):
+        self.start_metrics()
+        parse_pool = ProcessPoolExecutor(max_workers=self.parsers)
+        feeder = threading.Thread(target=self._feed_parsers,
+                                  args=(parse_pool,), daemon=True)
+        feeder.start()
+        try:
+            self._run_stage(self._unprocessed_staff_pages,
+                            self._processed_staff_pages, True,
+                            lambda: self._frontier_size() >= 10000)
+            print(f'Have processed {len(self._processed_staff_pages)} staff pages.')
+            self._run_stage(self._unprocessed_pages, self._processed_pages)
+        finally:
+            self._bodies.put(None)
+            feeder.join()
+            parse_pool.shutdown()
+        if self._state is not None:
+            self._state.checkpoint()
+        print(f'Have processed {len(self._processed_pages)} articles.')
+        self.stop_metrics()
+        self._unprocessed_pages.close()
+        self._clean_adj_list()
+        self.generate_report()
+
+    def _run_stage(self, queue, processed: VisitedSet, is_staff: bool = False,
+                   stop=lambda: False):
+        """Dispatches urls to fetchers until the queue is empty and no
+        page of the stage is being fetched or parsed."""
+        while not stop():
+            try:
+                url = self._take(queue, is_staff, timeout=0.1)
+            except Empty:
+                if not self._pending:
+                    break
+                continue
+            if not processed.add(url):
+                continue
+            self._change('_pending', 1)
+            self._pool.submit(self._fetch, url, is_staff)
+        with self._idle:
+            self._idle.wait_for(lambda: not self._pending)
+
+    def _fetch(self, url: str, is_staff: bool):
+        self._change('_fetching', 1)
+        body = None
+        try:
+            response = self.fetch(url)
+            if response.status_code != 200:
+                self.handle_page(url, response.status_code, response.text)
+            elif not self.reuse_links(url, response, is_staff):
+                body = response.text
+        except requests.RequestException as e:
+            print(f'Get request exception {e}')
+        except Exception as e:
+            print(f'Get Exception: {e}')
+        finally:
+            self._change('_fetching', -1)
+            # the page is done unless its body goes to the parsers
+            if body is None:
+                self._change('_pending', -1)
+        if body is None:
+            return
+        self._bodies.put((url, is_staff, body))
+        self._max_bodies = max(self._max_bodies, self._bodies.qsize())
+
+    def _feed_parsers(self, parse_pool):
+        while True:
+            item = self._bodies.get()
+            if item is None:
+                break
+            url, is_staff, body = item
+            self._parse_slots.acquire()
+            self._change('_parsing', 1)
+            future = parse_pool.submit(parse_page, body, self.base_url, is_staff)
+            future.add_done_callback(
+                lambda done, url=url, is_staff=is_staff, body=body,
+                start=time.perf_counter():
+                self._parsed(url, is_staff, done, start, body))
+
+    def _parsed(self, url: str, is_staff: bool, future, start: float,
+                body: str = None):
+        try:
+            found = future.result()
+            # in a worker process, including the wait for a free one
+            self.metrics.record_time('parse_latency',
+                                     time.perf_counter() - start)
+            self.store_parsed(url, found, is_staff, body)
+        except Exception as e:
+            print(f'Get Exception: {e}')
+        finally:
+            self._change('_parsing', -1)
+            self._parse_slots.release()
+            self._change('_pending', -1)
+
+    def _change(self, counter: str, value: int):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + value)
+            if not self._pending:
+                self._idle.notify_all()
+
+
+if __name__ == '__main__':
+    # All articles in Belarusian starting from the letter `п`.
+    crawler = PipelineCrawler('https://be.wikipedia.org/wiki/%D0%90%D0%B4%D0%BC%D1%8B%D1%81%D0%BB%D0%BE%D0%B2%D0%B0%D0%B5:AllPages?from=%D0%BF&to=&namespace=0')
+    crawler.run()
@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def log_bins(degrees: np.ndarray) -> np.ndarray:
+    """Amount of degrees per bin: bin 0 is degree 0,
+    bin `i` holds degrees from 2 ** (i - 1) to 2 ** i - 1."""
+    bins = np.zeros(len(degrees), dtype=np.int64)
+    positive = degrees > 0
+    bins[positive] = np.floor(np.log2(degrees[positive])).astype(np.int64) + 1
+    return np.bincount(bins, minlength=1)
+
+
+def _bin_rows(counts: np.ndarray):
+    return [{'from': 0 if i == 0 else 2 ** (i - 1),
+             'to': 0 if i == 0 else 2 ** i - 1,
+             'count': int(count)} for i, count in enumerate(counts)]
+
+
+def _write_atomic(path: str, write, mode: str = 'w', **kwargs):
+    """Writes the file with `write(file)` through a temporary file,
+    so readers never see it half-written."""
+    temporary = path + '.tmp'
+    with open(temporary, mode, **kwargs) as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+class DegreeReport:
+    """
+    Degree statistics of the crawled graph updated as pages finish:
+    in-degree and out-degree are kept per url id, log2 histograms and
+    the top-K pages by in-degree are computed from them on `snapshot`.
+    Every page should be added once.
+    """
+
+    def __init__(self, top: int = 100):
+        self.top = top
+        self.pages = 0
+        self.links = 0
+        self._in_degree = np.zeros(1024, dtype=np.int64)
+        self._out_degree = np.zeros(1024, dtype=np.int64)
+        self._crawled = np.zeros(1024, dtype=bool)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def add(self, url_id: int, link_ids) -> int:
+        """Counts links of the crawled page with `url_id`,
+        returns the amount of added pages."""
+        link_ids = np.fromiter(link_ids, dtype=np.int64)
+        with self._lock:
+            self._reserve(max(url_id, link_ids.max() if len(link_ids) else 0))
+            self._in_degree[link_ids] += 1
+            self._out_degree[url_id] = len(link_ids)
+            self._crawled[url_id] = True
+            self.pages += 1
+            self.links += len(link_ids)
+            return self.pages
+
+    def _reserve(self, url_id: int):
+        size = len(self._in_degree)
+        if url_id < size:
+            return
+        while size <= url_id:
+            size *= 2
+        for name in ('_in_degree', '_out_degree', '_crawled'):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def in_degree(self) -> np.ndarray:
+        with self._lock:
+            return self._in_degree.copy()
+
+    def snapshot(self, urls):
+        """Summary, histograms and top pages, `urls` maps ids to urls."""
+        with self._lock:
+            crawled = self._crawled.copy()
+            in_degree = self._in_degree[crawled]
+            out_degree = self._out_degree[crawled]
+            ids = np.flatnonzero(self._in_degree)
+            counts = self._in_degree[ids]
+            pages, links = self.pages, self.links
+        if len(ids) > self.top:
+            best = np.argpartition(-counts, self.top - 1)[:self.top]
+            ids, counts = ids[best], counts[best]
+        order = np.lexsort((ids, -counts))
+        return {
+            'pages': pages,
+            'links': links,
+            'in_degree_bins': _bin_rows(log_bins(in_degree)),
+            'out_degree_bins': _bin_rows(log_bins(out_degree)),
+            'top': [[urls.url(int(ids[i])), int(counts[i])] for i in order],
+        }
+
+    def write(self, directory: str, urls, image: bool = False):
+        """
+        Writes the snapshot to `report.json`, top pages to `top.csv`
+        and, with `image`, histograms of degrees to `degrees.png`.
+        """
+        snapshot = self.snapshot(urls)
+        os.makedirs(directory, exist_ok=True)
+        with self._write_lock:
+            _write_atomic(os.path.join(directory, 'report.json'),
+                          lambda f: json.dump(snapshot, f, ensure_ascii=False,
+                                              indent=1))
+            _write_atomic(os.path.join(directory, 'top.csv'),
+                          lambda f: self._write_top(snapshot, f), newline='')
+            if image:
+                _write_atomic(os.path.join(directory, 'degrees.png'),
+                              lambda f: self._plot(snapshot, f), 'wb')
+        return snapshot
+
+    @staticmethod
+    def _write_top(snapshot: dict, file):
+        writer = csv.writer(file)
+        writer.writerow(['url', 'in_degree'])
+        writer.writerows(snapshot['top'])
+
+    @staticmethod
+    def _plot(snapshot: dict, file):
+        # Agg canvas draws without a display and doesn't touch pyplot state
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(10, 4))
+        FigureCanvasAgg(figure)
+        for i, (key, title) in enumerate((('in_degree_bins', 'In-degree'),
+                                          ('out_degree_bins', 'Out-degree'))):
+            rows = snapshot[key]
+            axes = figure.add_subplot(1, 2, i + 1)
+            axes.bar(range(len(rows)), [row['count'] for row in rows],
+                     color='g')
+            axes.set_xticks(range(len(rows)))
+            axes.set_xticklabels([f'{row["from"]}+' for row in rows],
+                                 rotation='vertical')
+            axes.set_xlabel(title)
+            axes.set_ylabel('Pages')
+        figure.tight_layout()
+        figure.savefig(file, format='png')
+
+
+class ReportWriter:
+    """
+    Writes snapshots of the report to `directory` in a background
+    thread, so `request` doesn't block the crawl; requests made while
+    a snapshot is written are merged into the next one.
+    """
+
+    def __init__(self, report: DegreeReport, directory: str, urls):
+        self.report = report
+        self.directory = directory
+        self.urls = urls
+        self.written = 0
+        self._due = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def request(self):
+        """Asks for a snapshot, the thread is started on the first one."""
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._write_forever,
+                                                daemon=True)
+                self._thread.start()
+        self._due.set()
+
+    def _write_forever(self):
+        while True:
+            self._due.wait()
+            self._due.clear()
+            if self._stop.is_set():
+                break
+            self.report.write(self.directory, self.urls)
+            self.written += 1
+
+    def stop(self):
+        """Stops the thread, a snapshot being written is finished."""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._due.set()
+            self._thread.join()
+            self._thread = None
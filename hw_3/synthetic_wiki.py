@@ -0,0 +1,174 @@
+import threading
+from hashlib import blake2b
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAFF_PATH = '/wiki/Special:AllPages'
+LAST_MODIFIED = 'Mon, 01 Jan 2018 00:00:00 GMT'
+
+ARTICLE_TEMPLATE = '''<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>
+<div id="mw-head"><ul>
+<li id="ca-nstab-main" class="selected"><a href="/wiki/{title}">{kind}</a></li>
+<li id="ca-talk"><a href="/wiki/Talk:{title}">Talk</a></li>
+</ul></div>
+<div id="content">
+<h1 id="firstHeading">{title}</h1>
+<div id="bodyContent">
+{paragraphs}
+</div>
+<div id="catlinks"><ul>
+<li><a href="/wiki/Category:{category}">{category}</a></li>
+</ul></div>
+</div>
+<div id="footer"><a href="/wiki/About">About</a></div>
+</body></html>
+'''
+
+STAFF_TEMPLATE = '''<!DOCTYPE html>
+<html><head><title>All pages</title></head>
+<body>
+<div id="content">
+<div class="mw-allpages-nav">{navigation}</div>
+<div class="mw-allpages-body"><ul>
+{items}
+</ul></div>
+<div class="mw-allpages-nav">{navigation}</div>
+</div>
+</body></html>
+'''
+
+
+def article_title(index: int):
+    return f'Article_{index}'
+
+
+def article_links(index: int, articles: int, links: int):
+    """Indexes of articles the article links to."""
+    return sorted({(index * 7 + k * 13 + 1) % articles
+                   for k in range(links)} - {index})
+
+
+def build_article(index: int, articles: int, links: int = 10,
+                  padding: int = 0, kind: str = 'Артыкул'):
+    paragraphs = []
+    for target in article_links(index, articles, links):
+        paragraphs.append(
+            f'<p>See <a href="/wiki/{article_title(target)}" '
+            f'title="{article_title(target)}">{article_title(target)}</a>'
+            f' for details. {"Lorem ipsum dolor sit amet. " * padding}</p>')
+    return ARTICLE_TEMPLATE.format(title=article_title(index), kind=kind,
+                                   paragraphs='\n'.join(paragraphs),
+                                   category=f'Category_{index % 5}')
+
+
+def build_wiki(articles: int = 100, links: int = 10,
+               per_staff_page: int = 20, padding: int = 0,
+               non_articles: int = 0):
+    """
+    Builds {path: html} of a synthetic wiki: `AllPages` staff pages
+    listing `articles` articles, each one linking to `links` others.
+    The last `non_articles` of them are marked as non-article pages.
+    """
+    pages = dict()
+    starts = list(range(0, articles, per_staff_page))
+    for number, start in enumerate(starts):
+        path = STAFF_PATH if not number else \
+            f'/w/index.php?title=Special:AllPages&from={article_title(start)}'
+        navigation = []
+        if number + 1 < len(starts):
+            navigation.append(
+                f'<a href="/w/index.php?title=Special:AllPages&amp;from='
+                f'{article_title(starts[number + 1])}">Next page</a>')
+        items = '\n'.join(
+            f'<li><a href="/wiki/{article_title(i)}">{article_title(i)}</a></li>'
+            for i in range(start, min(start + per_staff_page, articles)))
+        pages[path] = STAFF_TEMPLATE.format(navigation=' | '.join(navigation),
+                                            items=items)
+
+    for index in range(articles):
+        kind = 'Артыкул' if index < articles - non_articles else 'Старонка'
+        pages[f'/wiki/{article_title(index)}'] = build_article(
+            index, articles, links, padding, kind)
+    return pages
+
+
+class WikiServer:
+    """
+    Local HTTP server serving the synthetic wiki in a background thread.
+    Paths from `failures` answer 503 with `Retry-After` once, paths of
+    `redirects` answer 301 to their target path. Pages are
+    sent with an `ETag` of their text and `Last-Modified`, matching
+    conditional requests get `304 Not Modified`.
+    """
+
+    def __init__(self, pages: dict = None, failures=(), redirects=None):
+        self.pages = pages if pages is not None else build_wiki()
+        self.failures = set(failures)
+        self.redirects = dict(redirects or {})
+        self.requests = []
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def root(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    @property
+    def base_url(self):
+        return self.root + STAFF_PATH
+
+    def _handle(self, handler):
+        with self._lock:
+            self.requests.append(handler.path)
+            failed = handler.path in self.failures
+            self.failures.discard(handler.path)
+
+        page = self.pages.get(handler.path, None)
+        if failed:
+            status, body, headers = 503, b'Try later', {'Retry-After': '0'}
+        elif handler.path in self.redirects:
+            status, body = 301, b''
+            headers = {'Location': self.redirects[handler.path]}
+        elif page is None:
+            status, body, headers = 404, b'Not found', {}
+        else:
+            body = page.encode('utf-8')
+            headers = {'ETag': f'"{blake2b(body, digest_size=8).hexdigest()}"',
+                       'Last-Modified': LAST_MODIFIED}
+            status = 200
+            if handler.headers.get('If-None-Match', None) == headers['ETag']:
+                status, body = 304, b''
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'text/html; charset=utf-8')
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
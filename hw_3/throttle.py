@@ -0,0 +1,134 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+# statuses which mean the site is overloaded
+OVERLOAD_STATUSES = frozenset([429, 503])
+# default ceiling of requests in flight
+MAX_CONCURRENCY = 64
+
+
+class TokenBucket:
+    """Allows `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        assert rate > 0, '`rate` should be positive.'
+        assert burst > 0, '`burst` should be positive.'
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        """Takes a token, returns how long to wait until it is valid."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        delay = self.take()
+        if delay:
+            time.sleep(delay)
+
+
+class HostRateLimiter:
+    """Token bucket per host of requested urls."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = dict()
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host, None)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate,
+                                                           self.burst)
+        return bucket
+
+    def acquire(self, url: str):
+        self.bucket(url).acquire()
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit of requests in flight.
+
+    After every `window` healthy responses the limit grows by one;
+    an overload status, a failed request or p95 latency of the window
+    above `tolerance` times the baseline (the lowest p95 seen, drifting
+    slowly towards the current one) multiplies it by `backoff`.
+    Responses to requests sent before a decrease don't decrease it
+    again.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1,
+                 maximum: int = MAX_CONCURRENCY, window: int = 20,
+                 backoff: float = 0.5, tolerance: float = 2.0):
+        assert 0 < minimum <= initial <= maximum, \
+            '`initial` should be between positive `minimum` and `maximum`.'
+        assert 0 < backoff < 1, '`backoff` should be in (0, 1).'
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._latencies = []
+        self._baseline = None
+        self._cooldown = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """Waits until one more request fits into the limit."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    def release(self, latency: float, status: int = None):
+        """Records the finished request, `status` is None on failure."""
+        with self._condition:
+            self._in_flight -= 1
+            if self._cooldown:
+                self._cooldown -= 1
+            elif status is None or status in OVERLOAD_STATUSES:
+                self._decrease()
+            else:
+                self._latencies.append(latency)
+                if len(self._latencies) >= self.window:
+                    self._adjust()
+            self._condition.notify_all()
+
+    def _adjust(self):
+        latencies = sorted(self._latencies)
+        self._latencies = []
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        if self._baseline is None:
+            self._baseline = p95
+        if p95 > self._baseline * self.tolerance:
+            self._decrease()
+        else:
+            self._baseline = min(p95, 0.9 * self._baseline + 0.1 * p95)
+            self._limit = min(self.maximum, self._limit + 1)
+
+    def _decrease(self):
+        self._limit = max(self.minimum, self._limit * self.backoff)
+        self._latencies = []
+        self._cooldown = self._in_flight
@@ -0,0 +1,98 @@
+import math
+from hashlib import blake2b
+
+
+class VisitedSet:
+    """Interface of the set of already processed urls."""
+
+    def add(self, url: str) -> bool:
+        """Adds the url, returns True if it hasn't been seen before."""
+        raise NotImplementedError
+
+    def __contains__(self, url):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+
+class ExactVisitedSet(VisitedSet):
+    """Visited urls in a hash set, no false positives."""
+
+    def __init__(self, urls=()):
+        self._urls = set(urls)
+
+    def add(self, url: str) -> bool:
+        if url in self._urls:
+            return False
+        self._urls.add(url)
+        return True
+
+    def __contains__(self, url):
+        return url in self._urls
+
+    def __len__(self):
+        return len(self._urls)
+
+    def __iter__(self):
+        return iter(self._urls)
+
+
+class BloomVisitedSet(VisitedSet):
+    """
+    Memory-bounded Bloom filter of visited urls.
+
+    Up to `capacity` urls are kept with `error_rate` probability that
+    an unseen url is reported as visited; visited urls are always
+    reported. The filter takes -capacity * ln(error_rate) / ln(2)^2 bits.
+    """
+
+    def __init__(self, capacity: int = 10000000, error_rate: float = 0.001):
+        assert capacity > 0, '`capacity` should be positive.'
+        assert 0 < error_rate < 1, '`error_rate` should be in (0, 1).'
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._bits = max(8, int(-capacity * math.log(error_rate)
+                                / math.log(2) ** 2))
+        self._hashes = max(1, round(self._bits / capacity * math.log(2)))
+        self._filter = bytearray((self._bits + 7) // 8)
+        self._count = 0
+
+    @property
+    def size_bytes(self):
+        return len(self._filter)
+
+    def _positions(self, url: str):
+        """Bit positions of the url by double hashing of one digest."""
+        digest = int.from_bytes(
+            blake2b(url.encode('utf-8'), digest_size=16).digest(), 'little')
+        first, second = digest >> 64, digest & 0xffffffffffffffff | 1
+        bits = self._bits
+        return [(first + i * second) % bits for i in range(self._hashes)]
+
+    def add(self, url: str) -> bool:
+        bloom = self._filter
+        new = False
+        for position in self._positions(url):
+            bit = 1 << (position & 7)
+            if not bloom[position >> 3] & bit:
+                bloom[position >> 3] |= bit
+                new = True
+        if new:
+            self._count += 1
+        return new
+
+    def __contains__(self, url):
+        bloom = self._filter
+        for position in self._positions(url):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        """Approximate amount of added urls."""
+        return self._count
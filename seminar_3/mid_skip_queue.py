@@ -1,8 +1,77 @@
+import heapq
 import reprlib
 from collections import deque
+from itertools import chain, islice
 
 
-class MidSkipQueue(object):
+class _MidSkipReads(object):
+    """
+    Read-only sequence methods over `_parts()`, the head and the tail
+    in the order of the `list`; nothing is materialized.
+    """
+
+    def _parts(self):
+        raise NotImplementedError
+
+    @property
+    def list(self):
+        return list(iter(self))
+
+    def index(self, value, start=0, stop=None):
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for i, item in enumerate(islice(iter(self), start, stop), start):
+            if item == value:
+                return i
+        return -1
+
+    def __iter__(self):
+        head, tail = self._parts()
+        return chain(head, tail)
+
+    def __len__(self):
+        head, tail = self._parts()
+        return len(head) + len(tail)
+
+    def __getitem__(self, y):
+        head, tail = self._parts()
+        if isinstance(y, slice):
+            return [self[i] for i in range(*y.indices(len(self)))]
+        if y < 0:
+            y += len(head) + len(tail)
+        if 0 <= y < len(head):
+            return head[y]
+        if 0 <= y - len(head) < len(tail):
+            return tail[y - len(head)]
+        raise IndexError('index out of range')
+
+    def __contains__(self, item):
+        head, tail = self._parts()
+        return item in head or item in tail
+
+    def __str__(self):
+        repr = reprlib.Repr()
+        repr.maxlist = 10
+        return repr.repr(self.list)
+
+
+class MidSkipQueueView(_MidSkipReads):
+    """Read-only snapshot of a queue sharing its storage: the queue
+    copies the storage on its next change instead."""
+
+    def __init__(self, k, head, tail):
+        self._k = k
+        self._head = head
+        self._tail = tail
+
+    @property
+    def k(self):
+        return self._k
+
+    def _parts(self):
+        return self._head, self._tail
+
+
+class MidSkipQueue(_MidSkipReads):
     def __init__(self, k, iterable=None):
         assert isinstance(k, int), (
             'The `k` argument must be an instance of '
@@ -21,54 +90,64 @@ class MidSkipQueue(object):
         self._k = k
         self._head = []
         self._tail = deque(maxlen=k)
-        self._list = None
+        # the storage is shared with a snapshot or a copy
+        self._shared = False
 
-        if iterable:
-            self.__add__(iterable)
+        if iterable is not None:
+            self.extend(iterable)
 
     @property
     def k(self):
         return self._k
 
-    @property
-    def list(self):
-        if not self._list:
-            self._list = self._head + list(self._tail)
-        return self._list
+    def _parts(self):
+        return self._head, self._tail
 
-    def copy(self):
-        return self.__class__(self.k, self.list)
+    def _own(self):
+        """Copies the shared storage before a change."""
+        if self._shared:
+            self._head = list(self._head)
+            self._tail = deque(self._tail, maxlen=self.k)
+            self._shared = False
+
+    def snapshot(self):
+        """Read-only view of the current items without copying them."""
+        self._shared = True
+        return MidSkipQueueView(self.k, self._head, self._tail)
 
-    def index(self, *args, **kwargs):
-        try:
-            return self.list.index(*args, **kwargs)
-        except ValueError:
-            return -1
+    def copy(self):
+        queue = self.__class__.__new__(self.__class__)
+        queue._k = self.k
+        queue._head = self._head
+        queue._tail = self._tail
+        queue._shared = self._shared = True
+        return queue
 
     def append(self, p_object, *args):
+        self._own()
         if len(self._head) < self.k:
             self._head.append(p_object)
         else:
             self._tail.append(p_object)
         if len(args):
-            self.__add__(args)
-        self._list = None
-
-    def __add__(self, another):
+            self.extend(args)
+
+    def extend(self, iterable):
+        """
+        Adds items of the iterable in one pass: the head takes the
+        first of them, the tail keeps only the last k of the rest, so
+        iterators of any length take O(k) memory.
+        """
+        self._own()
+        items = iter(iterable)
         if len(self._head) < self.k:
-            count = min(len(another), self.k - len(self._head))
-            self._head += another[:count]
-            another = another[count:]
-        if len(another):
-            count = min(self.k, len(another))
-            if count == self.k:
-                self._tail = deque(another[len(another) - count:],
-                                   maxlen=self.k)
-            else:
-                self._tail.extend(another[len(another) - count:])
-        self._list = None
+            self._head.extend(islice(items, self.k - len(self._head)))
+        self._tail.extend(items)
         return self
 
+    def __add__(self, another):
+        return self.extend(another)
+
     def __eq__(self, another):
         assert isinstance(another, MidSkipQueue), (
             'The `another` argument must be an instance of '
@@ -77,28 +156,30 @@ class MidSkipQueue(object):
         )
 
         if self.k == another.k:
-            return self.list == another.list
+            return len(self) == len(another) and \
+                all(a == b for a, b in zip(self, another))
         return False
 
-    def __iter__(self):
-        return iter(self.list)
 
-    def __len__(self):
-        return len(self.list)
+class _Max(object):
+    """Item of a max-heap on top of `heapq`."""
+    __slots__ = ('value',)
 
-    def __getitem__(self, y):
-        return self.list.__getitem__(y)
-
-    def __contains__(self, *args, **kwargs):
-        return self.list.__contains__(*args, **kwargs)
+    def __init__(self, value):
+        self.value = value
 
-    def __str__(self):
-        repr = reprlib.Repr()
-        repr.maxlist = 10
-        return repr.repr(self.list)
+    def __lt__(self, another):
+        return another.value < self.value
 
 
 class MidSkipPriorityQueue(MidSkipQueue):
+    """
+    Keeps the k smallest items in a max-heap and the k largest of
+    the rest in a min-heap, so `append` takes O(log k). The `list`
+    is the smallest items ascending and then the largest descending.
+    """
+    chunk_size = 65536
+
     def __init__(self, k, iterable=None):
         assert isinstance(k, int), (
             'The `k` argument must be an instance of '
@@ -115,62 +196,134 @@ class MidSkipPriorityQueue(MidSkipQueue):
             )
 
         self._k = k
+        # max-heap of `_Max` items and min-heap of items
         self._head = []
         self._tail = []
 
         self._list = None
 
-        if iterable:
-            self.__add__(iterable)
+        if iterable is not None:
+            self.extend(iterable)
 
-    def _find_max(self, seq):
-        return max(range(len(seq)), key=seq.__getitem__)
+    @property
+    def list(self):
+        if self._list is None:
+            self._list = sorted(item.value for item in self._head) + \
+                sorted(self._tail, reverse=True)
+        return self._list
+
+    def _parts(self):
+        return self.list, ()
+
+    # only positional reads sort the heaps into the `list`
+    def __len__(self):
+        return len(self._head) + len(self._tail)
+
+    def __contains__(self, item):
+        return item in self._tail or \
+            any(entry.value == item for entry in self._head)
 
-    def _find_min(self, seq):
-        return min(range(len(seq)), key=seq.__getitem__)
+    def snapshot(self):
+        # a changed queue builds a new `list` instead of changing it
+        return MidSkipQueueView(self.k, self.list, ())
+
+    def copy(self):
+        queue = self.__class__.__new__(self.__class__)
+        queue._k = self.k
+        queue._head = list(self._head)
+        queue._tail = list(self._tail)
+        queue._list = self._list
+        return queue
 
     def _add_tail(self, item):
-        if not len(self._tail):
-            self._tail.append(item)
-        else:
-            value = item
-            if item > self._tail[0]:
-                value = self._tail[0]
-                self._tail[0] = item
-            if len(self._tail) < self.k:
-                self._tail.append(value)
-            else:
-                j = self._find_min(self._tail)
-                if item > self._tail[j]:
-                    self._tail[j] = value
+        if len(self._tail) < self.k:
+            heapq.heappush(self._tail, item)
+        elif self._tail[0] < item:
+            heapq.heapreplace(self._tail, item)
 
     def append(self, p_object, *args):
-        value = p_object
         if len(self._head) < self.k:
-            if len(self._head) and p_object < self._head[0]:
-                value = self._head[0]
-                self._head[0] = p_object
-            self._head.append(value)
+            heapq.heappush(self._head, _Max(p_object))
+        elif p_object < self._head[0].value:
+            self._add_tail(
+                heapq.heapreplace(self._head, _Max(p_object)).value)
         else:
-            i = self._find_max(self._head)
-            if p_object < self._head[i]:
-                if p_object < self._head[0] and i:
-                    value = self._head[0]
-                    self._head[0] = p_object
-                self._add_tail(self._head[i])
-                self._head[i] = value
-            else:
-                self._add_tail(p_object)
+            self._add_tail(p_object)
         if len(args):
-            self.__add__(args)
+            self.extend(args)
         self._list = None
 
-    def __add__(self, another):
-        for item in another:
-            self.append(item)
+    def extend(self, iterable):
+        """
+        Adds items of the iterable, other iterables than lists and
+        tuples are read in batches of `chunk_size`, at least k, items.
+        """
+        if isinstance(iterable, (list, tuple)):
+            return self._extend_batch(iterable)
+        items = iter(iterable)
+        size = max(self.k, self.chunk_size)
+        for batch in iter(lambda: list(islice(items, size)), []):
+            self._extend_batch(batch)
+        return self
+
+    def _extend_batch(self, batch):
+        """
+        Batches of k items and longer are merged by selection: items
+        which can't beat the head or the tail are filtered out first,
+        the new head is the k smallest of the head and the rest of the
+        batch, the new tail is the k largest of the tail and everything
+        else.
+        """
+        if len(batch) < self.k:
+            for item in batch:
+                self.append(item)
+            return self
+
+        if len(self._head) < self.k:
+            smaller, larger = batch, []
+        else:
+            top = self._head[0].value
+            smaller = [item for item in batch if item < top]
+            larger = [item for item in batch if not item < top]
+            if len(self._tail) == self.k:
+                bottom = self._tail[0]
+                larger = [item for item in larger if bottom < item]
+            # few items pass the filters, the heaps take them one by one
+            if len(smaller) + len(larger) < self.k:
+                for item in smaller:
+                    self.append(item)
+                for item in larger:
+                    self._add_tail(item)
+                self._list = None
+                return self
+
+        head = [item.value for item in self._head]
+        head.extend(smaller)
+        if len(head) > self.k:
+            selected = heapq.nsmallest(self.k, head)
+            larger.extend(self._rest(head, selected))
+            head = selected
+        self._head = [_Max(item) for item in head]
+        heapq.heapify(self._head)
+
+        tail = self._tail + larger
+        if len(tail) > self.k:
+            tail = heapq.nlargest(self.k, tail)
+        heapq.heapify(tail)
+        self._tail = tail
         self._list = None
         return self
 
+    @staticmethod
+    def _rest(items, smallest):
+        """Items which aren't among the `smallest` ones."""
+        largest = smallest[-1]
+        rest = [item for item in items if largest < item]
+        equal = sum(1 for item in items if item == largest) - \
+            sum(1 for item in smallest if item == largest)
+        rest.extend([largest] * equal)
+        return rest
+
 
 if __name__ == '__main__':
     q = MidSkipPriorityQueue(1)
@@ -0,0 +1,39 @@
+import time
+from random import Random
+
+from seminar_3.mid_skip_queue import MidSkipPriorityQueue
+
+
+def bench_priority_queue(k: int = 10000, items: int = 10000000,
+                         batch: int = 100000, seed: int = 0):
+    """Feeds `items` random numbers to queues of size k one by one and
+    in batches, returns {way: items per second}."""
+    random = Random(seed)
+    data = [random.random() for _ in range(items)]
+    results = {}
+
+    q = MidSkipPriorityQueue(k)
+    start = time.perf_counter()
+    for item in data:
+        q.append(item)
+    results['append'] = items / (time.perf_counter() - start)
+    appended = q.list
+
+    q = MidSkipPriorityQueue(k)
+    start = time.perf_counter()
+    for i in range(0, items, batch):
+        q.extend(data[i:i + batch])
+    results['extend'] = items / (time.perf_counter() - start)
+    assert q.list == appended, 'append and extend disagree'
+    return results
+
+
+def run_priority_queue():
+    print(f'{"k":>8} {"items":>10} {"way":>8} {"items/s":>12}')
+    for k, items in ((10000, 10000000),):
+        for way, throughput in bench_priority_queue(k, items).items():
+            print(f'{k:>8} {items:>10} {way:>8} {throughput:>12.0f}')
+
+
+if __name__ == '__main__':
+    run_priority_queue()
@@ -89,6 +89,73 @@ class InterfaceTestCase(unittest.TestCase):
         self.assertEqual([], q.list)
         q += (6, 5, 3, 1, 2, 4, 8, 7)
         self.assertEqual([1, 2, 8, 7], q.list)
+        self.assertEqual(4, len(q))
+        self.assertIn(8, q)
+        self.assertIn(1, q)
+        self.assertNotIn(5, q)
+        self.assertEqual(8, q[2])
+
+        self._check_stdout_empty('mid_skip_queue')
+
+    def test_mid_skip_priority_queue_extend(self):
+        MidSkipPriorityQueue = self._load_function(0, 'mid_skip_queue', 'MidSkipPriorityQueue')
+
+        items = [(i * 7919) % 1000 for i in range(1000)]
+        q = MidSkipPriorityQueue(10)
+        q.extend(items[:5])
+        q.append(500)
+        q.extend(items[5:])
+        values = sorted(items + [500])
+        self.assertEqual(values[:10] + values[-10:][::-1], q.list)
+
+        q = MidSkipPriorityQueue(3, [5, 5, 5, 1, 9, 5, 5])
+        self.assertEqual([1, 5, 5, 9, 5, 5], q.list)
+        q.extend(x for x in (0, 10))
+        self.assertEqual([0, 1, 5, 10, 9, 5], q.list)
+
+    def test_mid_skip_queue_snapshot(self):
+        MidSkipQueue = self._load_function(0, 'mid_skip_queue', 'MidSkipQueue')
+
+        q = MidSkipQueue(2, range(6))
+        self.assertEqual(4, len(q))
+        self.assertEqual([0, 1, 4, 5], list(q))
+        self.assertEqual(4, q[2])
+        self.assertEqual(5, q[-1])
+        self.assertEqual([1, 4], q[1:3])
+        self.assertIn(4, q)
+        self.assertNotIn(3, q)
+        self.assertEqual(3, q.index(5, 1))
+        with self.assertRaises(IndexError):
+            q[4]
+
+        view = q.snapshot()
+        copy = q.copy()
+        q.append(6)
+        copy.append(7, 8)
+        self.assertEqual([0, 1, 5, 6], q.list)
+        self.assertEqual([0, 1, 7, 8], copy.list)
+        self.assertEqual([0, 1, 4, 5], view.list)
+        self.assertEqual(5, view[-1])
+
+        self._check_stdout_empty('mid_skip_queue')
+
+    def test_mid_skip_queue_stream(self):
+        MidSkipQueue = self._load_function(0, 'mid_skip_queue', 'MidSkipQueue')
+        MidSkipPriorityQueue = self._load_function(0, 'mid_skip_queue', 'MidSkipPriorityQueue')
+
+        q = MidSkipQueue(3, (i for i in range(1000000)))
+        self.assertEqual([0, 1, 2, 999997, 999998, 999999], q.list)
+        q = MidSkipQueue(2, (i for i in range(3)))
+        q += iter([3])
+        self.assertEqual([0, 1, 2, 3], q.list)
+        q = MidSkipQueue(1).extend(StringIO('a\nb\nc\n'))
+        self.assertEqual(['a\n', 'c\n'], q.list)
+
+        items = [(i * 7919) % 100000 for i in range(100000)]
+        q = MidSkipPriorityQueue(5)
+        q += iter(items)
+        values = sorted(items)
+        self.assertEqual(values[:5] + values[-5:][::-1], q.list)
 
         self._check_stdout_empty('mid_skip_queue')
 
@@ -1 +1,2 @@
 from .time_decorator import timeit
+from .cache_decorator import cached
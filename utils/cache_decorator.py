@@ -0,0 +1,95 @@
+import threading
+from collections import namedtuple
+from functools import wraps
+
+from hw_1.lru_cache import LRUCache
+
+CacheInfo = namedtuple('CacheInfo',
+                       ['hits', 'misses', 'coalesced', 'evictions', 'size',
+                        'max_size'])
+
+_MISSING = object()
+_KWARGS_MARK = object()
+
+
+class _Call:
+    """Result of the call which is being computed for the key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _make_key(args, kwargs):
+    if kwargs:
+        return args + (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    return args
+
+
+def cached(size: int = 128, ttl: int = 60):
+    """Memoizes the function in a `LRUCache` keyed by its arguments.
+
+    Concurrent misses on the same key call the function once, the
+    other callers wait for its result and are counted as `coalesced`,
+    not as hits. Hit/miss/eviction counters are available through
+    `cache_info()`.
+    """
+
+    def decorator(method):
+        cache = LRUCache(size=size, default_ttl=ttl)
+        lock = threading.Lock()
+        in_flight = dict()
+        counters = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+        @wraps(method)
+        def wrapped(*args, **kw):
+            key = _make_key(args, kw)
+            with lock:
+                value = cache.get(key, _MISSING)
+                if value is not _MISSING:
+                    counters['hits'] += 1
+                    return value
+                call = in_flight.get(key, None)
+                leader = call is None
+                if leader:
+                    counters['misses'] += 1
+                    call = in_flight[key] = _Call()
+                else:
+                    counters['coalesced'] += 1
+
+            if not leader:
+                call.done.wait()
+                if call.error:
+                    raise call.error
+                return call.result
+
+            try:
+                call.result = method(*args, **kw)
+                cache.push(key, call.result)
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with lock:
+                    in_flight.pop(key)
+                call.done.set()
+            return call.result
+
+        def cache_info():
+            return CacheInfo(counters['hits'], counters['misses'],
+                             counters['coalesced'], cache.evictions,
+                             cache.size, cache.max_size)
+
+        def cache_clear():
+            with lock:
+                cache.clean()
+                for name in counters:
+                    counters[name] = 0
+
+        wrapped.cache = cache
+        wrapped.cache_info = cache_info
+        wrapped.cache_clear = cache_clear
+        return wrapped
+
+    return decorator
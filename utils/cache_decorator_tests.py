@@ -0,0 +1,144 @@
+import importlib
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from time import sleep
+from unittest import mock
+
+
+class InterfaceTestCase(unittest.TestCase):
+    def setUp(self):
+        self._stdout_mock = self._setup_stdout_mock()
+
+    def _setup_stdout_mock(self):
+        patcher = mock.patch('sys.stdout', new=StringIO())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return patcher.new
+
+    def _check_stdout_empty(self, file_name):
+        if self._stdout_mock is not None:
+            self.assertFalse(self._stdout_mock.getvalue(),
+                             'no prints to console are allowed in "%s"' % file_name)
+
+    def _load_task(self, task_idx, file_name):
+        try:
+            loaded_task = importlib.import_module(file_name)
+        except ImportError:
+            self.fail('cannot import task #%d solution - no file "%s"' % (
+            task_idx, file_name))
+        return loaded_task
+
+    def _load_function(self, task_idx, file_name, func_names):
+        loaded_task = self._load_task(task_idx, file_name)
+
+        func_names = (func_names,) if isinstance(func_names,
+                                                 str) else func_names
+        loaded_functions = list(filter(None,
+                                       (getattr(loaded_task, func_name, None)
+                                        for func_name in func_names)))
+
+        self.assertEqual(1, len(loaded_functions),
+                         'cannot import task #%d solution - only one of function(-s) "%s" must be in file "%s"'
+                         % (task_idx, file_name, func_names))
+
+        return loaded_functions[0]
+
+    def _wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            sleep(0.01)
+        self.fail('condition is not met in 5 seconds')
+
+    def test_cached(self):
+        cached = self._load_function(0, 'utils.cache_decorator', 'cached')
+
+        calls = []
+
+        @cached(size=2, ttl=5)
+        def add(a, b=0):
+            calls.append((a, b))
+            return a + b if a else None
+
+        self.assertEqual(3, add(1, 2))
+        self.assertEqual(3, add(1, 2))
+        self.assertEqual(3, add(1, b=2))
+        self.assertEqual(3, add(1, b=2))
+        self.assertEqual([(1, 2), (1, 2)], calls)
+        self.assertEqual('add', add.__name__)
+
+        # `None` results are cached as well
+        self.assertEqual(None, add(0))
+        self.assertEqual(None, add(0))
+        self.assertEqual(3, len(calls))
+
+        info = add.cache_info()
+        self.assertEqual((3, 3, 0, 1, 2, 2), tuple(info))
+        self.assertEqual(info.hits, 3)
+        self.assertEqual(info.misses, 3)
+        self.assertEqual(info.evictions, 1)
+
+        add.cache_clear()
+        self.assertEqual((0, 0, 0), add.cache_info()[:3])
+        self.assertEqual(0, add.cache_info().size)
+        self.assertEqual(3, add(1, 2))
+        self.assertEqual(4, len(calls))
+
+        self._check_stdout_empty('cache_decorator')
+
+    def test_single_flight(self):
+        cached = self._load_function(0, 'utils.cache_decorator', 'cached')
+
+        calls = []
+        release = threading.Event()
+
+        @cached(size=10, ttl=5)
+        def slow(key):
+            calls.append(key)
+            release.wait()
+            return key * 2
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(slow, 21) for _ in range(8)]
+            # the other callers wait for the first one
+            self._wait_for(lambda: slow.cache_info().coalesced == 7)
+            release.set()
+            self.assertEqual([42] * 8, [f.result() for f in futures])
+        self.assertEqual([21], calls)
+        self.assertEqual((0, 1, 7), slow.cache_info()[:3])
+
+        self._check_stdout_empty('cache_decorator')
+
+    def test_single_flight_error(self):
+        cached = self._load_function(0, 'utils.cache_decorator', 'cached')
+
+        calls = []
+        release = threading.Event()
+
+        @cached(size=10, ttl=5)
+        def failing(key):
+            calls.append(key)
+            release.wait()
+            raise ValueError(key)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(failing, 1) for _ in range(4)]
+            self._wait_for(lambda: failing.cache_info().coalesced == 3)
+            release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+        self.assertEqual([1], calls)
+
+        # errors aren't cached
+        with self.assertRaises(ValueError):
+            failing(1)
+        self.assertEqual([1, 1], calls)
+
+        self._check_stdout_empty('cache_decorator')
+
+
+if __name__ == '__main__':
+    unittest.main()